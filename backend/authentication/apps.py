@@ -8,3 +8,6 @@ from django.apps import AppConfig
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self): #Registrar las señales de la aplicación
+        from . import signals  # noqa: F401
@@ -1,19 +1,55 @@
+import hashlib
+import time
+try:
+    from blake3 import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+from django.core.cache import cache
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from .models import UserProfile
 
 """ Que es la autenticación?
     La autenticación es el proceso de verificar la identidad de un usuario.
     En Django, la autenticación se utiliza para verificar la identidad de un usuario.
 """
+TOKEN_CACHE_MAX_TIMEOUT = 300 #Tiempo máximo (segundos) que se guarda un token validado en cache
+
+def get_token_cache_key(access_token): #Clave de cache para un token de acceso (hash corto, no el token completo)
+    if BLAKE3_AVAILABLE:#BLAKE3 usa instrucciones SIMD y es más rápido que blake2b
+        return 'jwt:' + blake3(access_token.encode()).hexdigest(length=16)
+    return 'jwt:' + hashlib.blake2b(access_token.encode(), digest_size=16).hexdigest()
+
+def get_user_jwt_version(user_id): #Versión actual de los tokens del usuario, guardada en su perfil (0 si nunca se revocaron)
+    return UserProfile.get_jwt_version(user_id)
+
+def bump_user_jwt_version(user_id): #Incrementar la versión invalida todos los tokens emitidos antes
+    return UserProfile.bump_jwt_version(user_id)
+
+def check_token_version(token, user_id): #Rechazar el token si su versión no coincide con la actual del usuario
+    if token.get('ver', 0) != get_user_jwt_version(user_id):
+        raise InvalidToken('El token ha sido revocado')
+
 #Autenticación de usuarios con cookies
 class CookiesJWTAuthentication(JWTAuthentication):
     def authenticate(self, request): #Método para autenticar el usuario
         access_token = request.COOKIES.get('access_token')#Obtener el token de acceso de las cookies
         if not access_token:
             return None
+        cache_key = get_token_cache_key(access_token)
+        cached = cache.get(cache_key)#Si el token ya fue validado se evita la firma y la consulta del usuario (la versión se sigue leyendo)
+        if cached is not None:
+            check_token_version(cached[1], cached[0].id)#La versión se revisa siempre, el token pudo revocarse después de guardarse
+            return cached
         validated_token = self.get_validated_token(access_token)#Validar el token de acceso
         try:
             user = self.get_user(validated_token)#Obtener el usuario autenticado
         except AuthenticationFailed:
             return None
+        check_token_version(validated_token, user.id)#Comparar la versión del token con la del usuario (de la cache compartida o de su perfil, ver SHARED_CACHE)
+        ttl = int(validated_token['exp'] - time.time())#Segundos que le quedan al token antes de expirar
+        if ttl > 0:
+            cache.set(cache_key, (user, validated_token), timeout=min(ttl, TOKEN_CACHE_MAX_TIMEOUT))
         return user, validated_token
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-16 19:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['owner', 'completed'], name='authenticat_owner_i_42dcc8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['owner', 'id'], name='authenticat_owner_i_7b0258_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-16 20:00
+
+import authentication.renderers
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_todo_authenticat_owner_i_42dcc8_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('todos', models.JSONField(default=list, encoder=authentication.renderers.DataclassJSONEncoder)),
+                ('todos_version', models.PositiveIntegerField(default=0)),
+                ('jwt_version', models.PositiveIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -1,13 +1,111 @@
-from django.db import models
+from dataclasses import dataclass
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from .renderers import DataclassJSONEncoder
 
 #Modelo de la tabla Todo
 """ Que es un modelo?
     Un modelo es una clase que representa una tabla en la base de datos.
     En Django, los modelos se utilizan para crear tablas en la base de datos.
 """
+#Manager con las consultas de Todo ya optimizadas
+class TodoManager(models.Manager):
+    def for_owner(self, user): #Todos de un usuario con el dueño precargado (evita N+1 si se serializa el owner)
+        owner_id = getattr(user, 'pk', user)#Acepta el usuario o directamente su id
+        return self.select_related('owner').only('id', 'name', 'completed', 'owner__username').filter(owner_id=owner_id)
+
 class Todo(models.Model):
     name = models.CharField(max_length=200)
     completed = models.BooleanField(default=False)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='todos')
 
+    objects = TodoManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'completed']),#Filtrar todos por usuario y estado
+            models.Index(fields=['owner', 'id']),#Listar todos de un usuario en orden
+        ]
+
+#Objeto ligero con los datos de un Todo (sin diccionario por fila)
+@dataclass(slots=True, frozen=True)
+class TodoDTO:
+    id: int
+    name: str
+    completed: bool
+
+
+#Las versiones se guardan en la base de datos; la cache solo guarda una copia si la comparten todos los procesos
+VERSION_CACHE_SHARED = settings.SHARED_CACHE
+VERSION_CACHE_TIMEOUT = 300 #Segundos que se guarda la copia de una versión (acota cualquier carrera entre procesos)
+
+#Perfil del usuario con una copia desnormalizada de sus todos
+class UserProfile(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
+    todos = models.JSONField(default=list, encoder=DataclassJSONEncoder)#Lista de todos lista para devolver en una sola consulta
+    todos_version = models.PositiveIntegerField(default=0)#Cambia con cada escritura de un Todo
+    jwt_version = models.PositiveIntegerField(default=0)#Incrementarla revoca todos los tokens emitidos antes
+
+    @staticmethod
+    def build_todos(user_id): #Construir la lista de todos desde la tabla Todo
+        rows = Todo.objects.for_owner(user_id).order_by('id').values_list('id', 'name', 'completed')#Tuplas en vez de diccionarios
+        return [TodoDTO(*row) for row in rows]
+
+    @classmethod
+    def refresh_todos(cls, user_id): #Actualizar la copia desnormalizada y su versión si el perfil existe
+        with transaction.atomic():
+            #Bloquear la fila del perfil: dos escrituras simultáneas reconstruyen la lista una después de la otra
+            version = cls.objects.select_for_update().filter(user_id=user_id).values_list('todos_version', flat=True).first()
+            if version is None:
+                return
+            version += 1
+            cls.objects.filter(user_id=user_id).update(todos=cls.build_todos(user_id), todos_version=version)
+        cls._cache_version(user_id, 'todos_version', version)
+
+    @classmethod
+    def get_todos(cls, user_id): #Leer los todos del perfil, creándolo para usuarios antiguos que no lo tienen
+        todos = cls.objects.filter(user_id=user_id).values_list('todos', flat=True).first()
+        if todos is None:
+            todos = cls.build_todos(user_id)
+            cls.objects.get_or_create(user_id=user_id, defaults={'todos': todos})
+        return todos
+
+    @classmethod
+    def get_todos_version(cls, user_id): #Versión de los todos del usuario, cambia con cada escritura
+        return cls.get_version(user_id, 'todos_version')
+
+    @classmethod
+    def get_jwt_version(cls, user_id): #Versión actual de los tokens del usuario (0 si nunca se revocaron)
+        return cls.get_version(user_id, 'jwt_version')
+
+    @classmethod
+    def bump_jwt_version(cls, user_id): #Incrementar la versión en la base de datos y publicarla a los demás procesos
+        if not cls.objects.filter(user_id=user_id).update(jwt_version=F('jwt_version') + 1):
+            cls.objects.get_or_create(user_id=user_id, defaults={'todos': cls.build_todos(user_id)})#Usuarios antiguos sin perfil
+            cls.objects.filter(user_id=user_id).update(jwt_version=F('jwt_version') + 1)
+        version = cls._read_version(user_id, 'jwt_version')
+        cls._cache_version(user_id, 'jwt_version', version)
+        return version
+
+    @classmethod
+    def _read_version(cls, user_id, field): #Versión guardada en la base de datos (0 si el perfil no existe)
+        return cls.objects.filter(user_id=user_id).values_list(field, flat=True).first() or 0
+
+    @staticmethod
+    def _cache_version(user_id, field, version): #Publicar la versión nueva a los demás procesos
+        if VERSION_CACHE_SHARED:
+            cache.set(f'{field}:{user_id}', version, timeout=VERSION_CACHE_TIMEOUT)
+
+    @classmethod
+    def get_version(cls, user_id, field): #Leer una versión, desde la cache compartida si la hay
+        if not VERSION_CACHE_SHARED:#Con cache local cada proceso tendría su propia copia: se lee siempre la base de datos
+            return cls._read_version(user_id, field)
+        key = f'{field}:{user_id}'
+        version = cache.get(key)
+        if version is None:#No existe o fue desalojada: la base de datos sigue teniendo el valor correcto
+            version = cls._read_version(user_id, field)
+            cache.add(key, version, timeout=VERSION_CACHE_TIMEOUT)#add para no pisar una versión más nueva ya publicada
+        return version
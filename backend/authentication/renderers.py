@@ -0,0 +1,35 @@
+import dataclasses
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+""" Que es un renderizador?
+    Un renderizador convierte los datos de la respuesta en bytes
+    con el formato que pidió el cliente, en este caso JSON.
+"""
+
+#Codificador de DRF que además convierte dataclasses (como TodoDTO) a diccionarios
+class DataclassJSONEncoder(JSONEncoder):
+    def default(self, obj):
+        if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+            return dataclasses.asdict(obj)
+        return super().default(obj)
+
+_drf_encoder = DataclassJSONEncoder()#Codificador para tipos que orjson no conoce (Decimal, lazy strings, etc.)
+
+#Renderizador JSON con orjson (más rápido que json de la librería estándar)
+class FastJSONRenderer(JSONRenderer):
+    encoder_class = DataclassJSONEncoder#Usado cuando orjson no está instalado
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not ORJSON_AVAILABLE:#Sin orjson se usa el renderizador normal de DRF
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        #Las fechas pasan al codificador de DRF para conservar su formato ("Z" en UTC y milisegundos)
+        return orjson.dumps(data, default=_drf_encoder.default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
@@ -1,7 +1,11 @@
+import copy
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from .models import Todo
+from .authentication import get_user_jwt_version, check_token_version
 
 """ Que es un serializador?
     Un serializador es un objeto que convierte datos complejos
@@ -16,6 +20,12 @@ class UserRegisterSerializer(serializers.ModelSerializer):#Serializador para reg
     class Meta: #Meta clase para definir los campos del modelo  
         model = User #Modelo de datos
         fields = ['username', 'email', 'password'] #Campos del modelo
+    _cached_fields = None #Campos construidos una sola vez por proceso a partir de Meta
+    def get_fields(self): #Reutilizar los campos ya construidos en vez de recorrer el modelo en cada petición
+        cls = type(self)
+        if cls._cached_fields is None:
+            cls._cached_fields = super().get_fields()
+        return {name: copy.copy(field) for name, field in cls._cached_fields.items()} #Copia por instancia para no compartir el estado del bind
     def create(self, validated_data): #Método para crear un usuario
         user = User(
             username = validated_data['username'],
@@ -33,4 +43,18 @@ class UserSerializer(serializers.ModelSerializer):#Serializador para obtener los
 class TodoSerializer(serializers.ModelSerializer):#Serializador para obtener los datos de la tabla Todo 
     class Meta:
         model = Todo
-        fields = ['id', 'name', 'completed']
\ No newline at end of file
+        fields = ['id', 'name', 'completed']
+
+class VersionedTokenObtainPairSerializer(TokenObtainPairSerializer):#Serializador que agrega la versión del usuario a los tokens
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['ver'] = get_user_jwt_version(user.id)#El token de acceso hereda el claim del token de refresco
+        token['username'] = user.username#Permite responder is_logged_in validando solo la firma (por ejemplo en el edge)
+        return token
+
+class VersionedTokenRefreshSerializer(TokenRefreshSerializer):#Serializador que rechaza tokens de refresco revocados
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        check_token_version(refresh, refresh.payload.get(api_settings.USER_ID_CLAIM))
+        return super().validate(attrs)
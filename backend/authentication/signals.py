@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+from .models import Todo, UserProfile
+
+""" Que es una señal?
+    Una señal es una notificación que Django envía cuando ocurre un evento,
+    por ejemplo cuando se guarda o se elimina un registro de la base de datos.
+"""
+
+#Crear el perfil vacío al registrar un usuario
+@receiver(post_save, sender=User)
+def create_user_profile(sender, instance, created, **kwargs):
+    if created:
+        UserProfile.objects.get_or_create(user=instance)
+
+#Mantener sincronizada la copia de los todos en el perfil
+@receiver(post_save, sender=Todo)
+@receiver(post_delete, sender=Todo)
+def sync_profile_todos(sender, instance, **kwargs):
+    owner_id = instance.owner_id
+    #Después del commit, para que la reconstrucción vea la escritura del Todo (inmediato en modo autocommit)
+    transaction.on_commit(lambda: UserProfile.refresh_todos(owner_id))#También incrementa la versión usada en la cache de get_todos
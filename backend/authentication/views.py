@@ -1,18 +1,30 @@
-from django.contrib.auth import authenticate
+import hashlib
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
-from .models import Todo
-from .serializers import UserRegisterSerializer, UserSerializer, TodoSerializer
-from datetime import datetime, timedelta
+from .models import UserProfile
+from .serializers import UserRegisterSerializer, VersionedTokenObtainPairSerializer
+from .authentication import get_token_cache_key, bump_user_jwt_version
+from .renderers import FastJSONRenderer
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.conf import settings
 from rest_framework import status
 
 """ Que es una vista?
     Una vista es una función que se utiliza para procesar las solicitudes HTTP.
     En Django, las vistas se utilizan para procesar las solicitudes HTTP.
 """
+AUTH_COOKIE_KWARGS = dict(httponly=True, secure=True, samesite='None', path='/')#Atributos comunes de las cookies de los tokens
+_LOGOUT_BYTES = b'{"success":true}'#Respuesta fija de logout, se construye una sola vez
+_json_renderer = FastJSONRenderer()#Renderizador para respuestas que no pasan por la negociación de contenido de DRF
+
+def set_auth_cookies(res, access_token, refresh_token): #Establecer las cookies de acceso y refresco en la respuesta
+    res.set_cookie('access_token', access_token, **AUTH_COOKIE_KWARGS)
+    res.set_cookie('refresh_token', refresh_token, **AUTH_COOKIE_KWARGS)
+    return res
 
 #Vista para registrar un usuario
 @api_view(['POST'])#Decorador para indicar que es una vista de API
@@ -21,24 +33,23 @@ def register(request):
     serializer = UserRegisterSerializer(data=request.data)#Serializador para registrar un usuario
     if serializer.is_valid():#Si el serializador es válido
         user = serializer.save()#Guardar el usuario en la base de datos
-        return Response(serializer.data, status=status.HTTP_201_CREATED)#Devolver la respuesta con el usuario creado
+        refresh = VersionedTokenObtainPairSerializer.get_token(user)#Emitir los tokens sin volver a verificar la contraseña en /login/
+        access_token = str(refresh.access_token)
+        res = Response({**serializer.data, 'success':True, 'access':access_token}, status=status.HTTP_201_CREATED)#Usuario creado y token de acceso, igual que /login/
+        return set_auth_cookies(res, access_token, str(refresh))#Devolver la respuesta con las cookies de sesión
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)#Devolver el error si el serializador no es válido
 
 #Vista para obtener el token de acceso
 class CustomTokenObtainPairView(TokenObtainPairView):
     def post(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)#Serializador para obtener el token de acceso
         try:
             response = super().post(request, *args, **kwargs)#Respuesta de la vista
             tokens = response.data#Tokens de la respuesta
             access_token = tokens['access']#Token de acceso
             refresh_token = tokens['refresh']#Token de refresco
-            serializer = UserSerializer(request.user, many=False)#Serializador para obtener el usuario
             res = Response()#Respuesta
-            res.data = {'success':True, 'user':serializer.data, 'access':access_token}#Datos de la respuesta
-            res.set_cookie(key='access_token', value=str(access_token), httponly=True, secure=True, samesite='None', path='/')#Establecer el cookie de acceso
-            res.set_cookie(key='refresh_token', value=str(refresh_token), httponly=True, secure=True, samesite='None', path='/')#Establecer el cookie de refresco
-            return res#Devolver la respuesta
+            res.data = {'success':True, 'user':{'username':request.user.username}, 'access':access_token}#Datos de la respuesta
+            return set_auth_cookies(res, access_token, refresh_token)#Devolver la respuesta con las cookies
         except Exception as e:
             return Response({'success':False, 'error':str(e)}, status=status.HTTP_400_BAD_REQUEST)#Devolver el error si el serializador no es válido
         
@@ -63,10 +74,13 @@ class CustomTokenRefreshView(TokenRefreshView):
 @permission_classes([IsAuthenticated])
 def logout(request):
     try:
-        res = Response()#Respuesta
-        res.data = {'success':True}#Datos de la respuesta
+        access_token = request.COOKIES.get('access_token')#Token de acceso actual
+        if access_token:
+            cache.delete(get_token_cache_key(access_token))#Invalidar el token en cache para que no siga siendo válido
+        bump_user_jwt_version(request.user.id)#Revocar todos los tokens emitidos hasta ahora para el usuario
+        res = HttpResponse(_LOGOUT_BYTES, content_type='application/json')#Respuesta fija sin pasar por el renderizador
         res.delete_cookie('access_token', path='/',samesite='None')#Eliminar el cookie de acceso
-        res.delete_cookie('response_token', path='/',samesite='None')#Eliminar el cookie de refresco
+        res.delete_cookie('refresh_token', path='/',samesite='None')#Eliminar el cookie de refresco
         return res#Devolver la respuesta
     except Exception as e:
         return Response({'success':False, 'error':str(e)}, status=status.HTTP_400_BAD_REQUEST)#Devolver el error si el serializador no es válido
@@ -75,19 +89,31 @@ def logout(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_todos(request):
-    user = request.user#Usuario autenticado
-    todos = Todo.objects.filter(owner=user)#Todos del usuario autenticado
-    serializer = TodoSerializer(todos, many=True)#Serializador para obtener todos los todos
-    return Response(serializer.data, status=status.HTTP_200_OK)#Devolver la respuesta con los todos
+    user_id = request.user.id
+    cache_key = f'todos:{user_id}:{UserProfile.get_todos_version(user_id)}'#La clave cambia con cada escritura de un Todo
+    cached = cache.get(cache_key)
+    if cached is None:
+        payload = _json_renderer.render(UserProfile.get_todos(user_id))#Todos del usuario leídos del perfil (una sola consulta)
+        cached = ('"%s"' % hashlib.blake2b(payload, digest_size=16).hexdigest(), payload)#ETag calculado sobre el contenido
+        cache.set(cache_key, cached)
+    etag, payload = cached
+    res = HttpResponse(payload, content_type='application/json')#Devolver la respuesta con los todos
+    res['ETag'] = etag
+    return get_conditional_response(request, etag=etag, response=res)#304 si If-None-Match ya incluye esta versión (o es *)
 
 #Vista para verificar si el usuario está autenticado
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def is_logged_in(request):
-    serializer = UserSerializer(request.user, many=False)#Serializador para obtener el usuario
-    return Response(serializer.data, status=status.HTTP_200_OK)#Devolver la respuesta con el usuario
-
-
-
-
+    return HttpResponse(_json_renderer.render({'username':request.user.username}), content_type='application/json')#Devolver la respuesta con el usuario
 
+#Vista para publicar la clave pública de los JWT (EdDSA) y poder validarlos fuera de Django
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def jwt_public_key(request):
+    if not settings.JWT_VERIFYING_KEY:#Con HS256 no hay clave pública que publicar
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+    res = HttpResponse(settings.JWT_VERIFYING_KEY, content_type='application/x-pem-file')
+    res['Cache-Control'] = 'public, max-age=3600'
+    return res
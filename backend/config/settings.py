@@ -12,6 +12,11 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
+import os
+from dotenv import load_dotenv
+
+# Cargar variables de entorno desde .env
+load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -40,7 +45,6 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',#API REST  
     'rest_framework_simplejwt',#JWT
-    'rest_framework_simplejwt.token_blacklist',#JWT
     'corsheaders',#CORS
     'django_extensions',#Extensiones de Django
     'authentication',#Autenticación de usuarios
@@ -90,13 +94,19 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'authentication.renderers.FastJSONRenderer',  #JSON con orjson si está instalado
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
-    'ROTATE_REFRESH_TOKENS': False,
-    'BLACKLIST_AFTER_ROTATION': True,
+    'ROTATE_REFRESH_TOKENS': False,  #Sin rotación: refrescar no escribe en la base de datos
+    'BLACKLIST_AFTER_ROTATION': False,  #La revocación se hace con el claim 'ver' (ver authentication.py)
     'UPDATE_LAST_LOGIN': False,
+    'TOKEN_OBTAIN_SERIALIZER': 'authentication.serializers.VersionedTokenObtainPairSerializer',  #Agrega el claim 'ver' a los tokens
+    'TOKEN_REFRESH_SERIALIZER': 'authentication.serializers.VersionedTokenRefreshSerializer',  #Revisa el claim 'ver' al refrescar
     
     'AUTH_COOKIE': 'access_token',  #Definir el nombre de la cookie para el token de acceso
     'AUTH_COOKIE_REFRESH': 'refresh_token',  #Definir el nombre de la cookie para el token de refresco
@@ -106,6 +116,20 @@ SIMPLE_JWT = {
     'AUTH_COOKIE_SAMESITE': 'Lax',  #Ajustar según tus necesidades
 }
 
+# Firma de los JWT con Ed25519 (EdDSA): verificar es mucho más barato que con RS256.
+# Las claves se leen en formato PEM desde el entorno; se pueden generar con:
+#   openssl genpkey -algorithm ed25519 -out jwt_private.pem
+#   openssl pkey -in jwt_private.pem -pubout -out jwt_public.pem
+# Sin claves configuradas se mantiene HS256 con SECRET_KEY (desarrollo).
+JWT_SIGNING_KEY = os.environ.get('JWT_SIGNING_KEY', '').replace('\\n', '\n')
+JWT_VERIFYING_KEY = os.environ.get('JWT_VERIFYING_KEY', '').replace('\\n', '\n')
+if JWT_SIGNING_KEY and JWT_VERIFYING_KEY:
+    SIMPLE_JWT.update({
+        'ALGORITHM': 'EdDSA',
+        'SIGNING_KEY': JWT_SIGNING_KEY,
+        'VERIFYING_KEY': JWT_VERIFYING_KEY,
+    })
+
 CSRF_COOKIE_SECURE = False
 SESSION_COOKIE_SECURE = False
 CSRF_COOKIE_SAMESITE = 'Lax'
@@ -139,6 +163,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,  #Reutilizar la conexión entre peticiones (segundos)
+        'CONN_HEALTH_CHECKS': True,  #Verificar la conexión reutilizada antes de usarla
     }
 }
 
@@ -162,6 +188,15 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Hashers de contraseñas: Argon2 primero, PBKDF2 se mantiene para verificar
+# (y actualizar al iniciar sesión) las contraseñas ya existentes
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -184,9 +219,34 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Al inicio del archivo, después de los imports existentes
-import os
-from dotenv import load_dotenv
+# OpenAI: enviar los prompts del reporte completo por la Batch API (mitad de costo, puede tardar minutos)
+OPENAI_USE_BATCH_API = os.environ.get('OPENAI_USE_BATCH_API', '').lower() in ('1', 'true', 'yes')
+# OpenAI: reutilizar respuestas de prompts semánticamente parecidos (embeddings + similitud coseno)
+OPENAI_SEMANTIC_CACHE = os.environ.get('OPENAI_SEMANTIC_CACHE', '').lower() in ('1', 'true', 'yes')
+# Hilos que generan reportes completos en segundo plano (POST generate-comprehensive-report/?async=1)
+SMS_REPORT_JOB_WORKERS = int(os.environ.get('SMS_REPORT_JOB_WORKERS', '2'))
+
+# Cache compartida (Redis si se define REDIS_URL, memoria local en desarrollo)
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
-# Cargar variables de entorno desde .env
-load_dotenv()
\ No newline at end of file
+# La cache es compartida entre procesos solo con Redis. Sin REDIS_URL (LocMemCache) cada proceso tiene su copia,
+# así que la versión de los tokens JWT se lee de la base de datos en cada solicitud autenticada: aunque el token
+# esté en cache se hace una consulta a authentication_userprofile, y validar un token nuevo cuesta dos consultas.
+# Los reportes en segundo plano (generate-comprehensive-report/?async=1) también requieren cache compartida;
+# sin ella el reporte se genera de forma síncrona.
+SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache',
+)
@@ -1,28 +1,551 @@
 # backend/sms/enhanced_report_service.py - Versión con Debug Mejorado
+import asyncio
 import base64
+import functools
+import hashlib
+import heapq
+import importlib.util
 import io
+import json
+import logging
+import numpy as np
 import re
 import os
+import random
+import threading
+import time
 from datetime import datetime
-from collections import Counter
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import chain, islice
+from operator import itemgetter
 from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage, ListFlowable, ListItem
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, LongTable, TableStyle, Image as RLImage, ListFlowable, ListItem
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_JUSTIFY, TA_LEFT, TA_CENTER
+from PIL import Image as PILImage
 from django.conf import settings
+from django.core.cache import cache
+from reportlab import rl_config
 
-# Importaciones condicionales para OpenAI
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-    print("📦 OpenAI library imported successfully")
-except ImportError as e:
-    OPENAI_AVAILABLE = False
-    print(f"⚠️ OpenAI not installed: {e}")
+logger = logging.getLogger(__name__)
 
-from .semantic_analysis import SemanticResearchAnalyzer
+# Sin validación de atributos en las figuras de reportlab.graphics fuera de DEBUG.
+# shapes.py lee este valor al importarse, por eso se fija aquí y no alrededor de doc.build.
+# Con la validación apagada, un atributo inválido ya no lanza error.
+if not settings.DEBUG:
+    rl_config.shapeChecking = 0
+
+from .semantic_analysis import get_semantic_analyzer
+
+# Preámbulo fijo del mensaje de sistema. Supera los 1024 tokens para que todas las
+# solicitudes compartan el mismo prefijo y OpenAI aplique su cache automático de prompts.
+# Cualquier cambio aquí invalida ese cache y las respuestas guardadas en sms:ai:*.
+AI_SYSTEM_PREAMBLE = """You are an expert academic writer specializing in systematic reviews.
+
+ROLE
+You write sections of a methodological report produced by a Systematic Mapping Study (SMS) platform. \
+Each request contains one task (an abstract, an introduction, a results paragraph, the analysis of a \
+research sub-question, a discussion or the conclusions) together with the real data extracted by the \
+platform. Your text is inserted directly into a PDF document, after a heading that the platform writes \
+itself, so you only produce the body of the requested section.
+
+WHAT A SYSTEMATIC MAPPING STUDY IS
+A systematic mapping study is a secondary study that classifies and structures the published research \
+on a topic in order to give an overview of the field, identify research trends and detect gaps. Unlike \
+a systematic literature review, it does not aim to aggregate the evidence of primary studies in depth; \
+it answers broad questions such as which techniques are studied, in which contexts, by which research \
+approaches and how the volume of publications evolves over time. The process followed by the platform \
+is based on the guidelines of Kitchenham and Charters (Guidelines for performing Systematic Literature \
+Reviews in Software Engineering, 2007) and of Petersen et al. (Guidelines for conducting systematic \
+mapping studies in software engineering: An update, Information and Software Technology, 2015), and \
+reports the selection process with a PRISMA flow diagram (Page et al., 2021).
+
+THE PROCESS BEHIND THE DATA
+1. Planning: the authors define a principal research question (PRQ) and three research sub-questions \
+(RSQ_1, RSQ_2, RSQ_3), the keywords derived from the title, the search string, the period of study and \
+the inclusion and exclusion criteria.
+2. Execution: the search string is run on indexed bibliographic databases (Scopus, IEEE Xplore, Web of \
+Science and similar sources); duplicates are removed; titles and abstracts are screened against the \
+criteria; the remaining full texts are assessed; the studies that pass are marked as selected.
+3. Extraction: for every selected study the authors record the answer the study gives to each \
+sub-question, its research approach, its publication year and its venue.
+4. Reporting: the platform computes statistics over the extracted data and asks you to turn them into \
+academic prose.
+
+STYLE RULES
+- Write in the language requested by the task. When the task does not specify one, write in Spanish.
+- Use a formal, objective and impersonal academic register; prefer the passive voice or the first \
+person plural used in scientific writing.
+- Avoid gerunds at the start of sentences, rhetorical questions, exclamations, marketing language and \
+superlatives that the data do not support.
+- Write continuous paragraphs. Do not add titles, headings, bullet points, numbered lists, tables, \
+Markdown, HTML or any other markup unless the task explicitly asks for a structure.
+- Do not add greetings, introductions about yourself, notes about the task or closing remarks; answer \
+only with the requested text.
+- Keep each paragraph focused on one idea and connect paragraphs with explicit transitions.
+- When citing, use the bracketed numeric style of the report, for example [1] or [2],[3], and only \
+cite references that the task provides. Never invent authors, titles, years, venues or DOIs.
+
+USE OF DATA
+- Base every quantitative statement on the figures given in the task: number of studies, \
+distribution by year, percentages, categories and counts. Reproduce numbers exactly as provided.
+- When the data are insufficient to support a claim, say that the evidence is limited instead of \
+speculating.
+- Distinguish clearly between what the selected studies report and the interpretation made by the \
+authors of the mapping study.
+- Relate the findings to the research question being answered and, when relevant, to the principal \
+research question.
+
+TERMINOLOGY
+- SMS: systematic mapping study (mapeo sistemático).
+- SLR: systematic literature review (revisión sistemática de la literatura).
+- PRQ: principal research question (pregunta principal de investigación).
+- RSQ: research sub-question (subpregunta de investigación); RSQ_1, RSQ_2 and RSQ_3 are numbered as in \
+the report.
+- Primary study: each selected article (estudio primario).
+- Search string: the boolean combination of keywords and synonyms (cadena de búsqueda).
+- Inclusion and exclusion criteria: the rules applied during screening (criterios de inclusión y \
+exclusión).
+- Selection rate: the percentage of identified records that were finally included.
+- Research approach: qualitative, quantitative or mixed (enfoque cualitativo, cuantitativo o mixto).
+- Threats to validity: construct, internal, external and conclusion validity.
+
+SECTION GUIDANCE
+- Abstract: context, objective, method (SMS with the number of selected studies), main findings and \
+implications, in a single paragraph.
+- Introduction: the relevance of the topic, the problem, the gap that justifies the mapping study, \
+its objective and the structure of the report.
+- Results: describe the distribution of the selected studies before interpreting it, and answer each \
+sub-question with the categories and counts provided.
+- Discussion: compare the patterns found across sub-questions, explain possible causes, point out \
+research gaps and acknowledge the threats to validity.
+- Conclusions: summarize the answer to the principal research question and propose concrete lines of \
+future work derived from the gaps.
+
+OUTPUT FORMAT
+Return plain text only. Separate paragraphs with a blank line. When the task asks for a JSON object, \
+return exactly one valid JSON object with the requested keys and nothing else, and apply all the rules \
+above to the text inside each value."""
+
+# Párrafos fijos de la sección de metodología. Son plantillas str.format (no f-strings):
+# solo cambian los datos del estudio y quedan en un solo lugar para poder traducirlas.
+METHODOLOGY_TEMPLATES = {
+    'intro': (
+        "Este mapeo sistematico (SMS) se basa en las directrices "
+        "propuestas en [1],[2], "
+        "cuyo principal objetivo es analizar el estado actual de la "
+        "investigación relacionada con las aplicaciones informáticas "
+        "para {titulo}. Esta revisión consta de dos "
+        "etapas: planificación y ejecución. "
+        "La primera aborda la definición de las preguntas de investigación, "
+        "especificando la intervención de interés, "
+        "el proceso de búsqueda y la definición de los criterios de selección "
+        "de artículos. La segunda etapa implementa "
+        "el proceso de selección de las investigaciones relevantes para el objeto "
+        "de estudio, mediante "
+        "la aplicación de los criterios de selección y la extracción de datos para "
+        "obtener los resultados de esta revisión sistemática."
+    ),
+    'prq': (
+        "La intención de esta investigación se regirá por la pregunta "
+        "principal de investigación (PRQ): "
+        "{pregunta_principal}"
+    ),
+    'rsq_intro': (
+        "La PRQ busca localizar documentos relevantes sobre el tema "
+        "propuesto, para lograr este objetivo se divide en tres subpreguntas "
+        "de investigación (RSQ)."
+    ),
+    'databases': (
+        "Para llevar a cabo la búsqueda de publicaciones científicas que contribuyan "
+        "al análisis del objeto de estudio, se consideran tres bases "
+        "de datos de citas: Scopus, Web of Science (WoS) y PubMed. Las dos "
+        "primeras son bases de datos bibliográficas de resúmenes y citas de "
+        "artículos de revistas científicas. La tercera es un motor de búsqueda de "
+        "referencias bibliográficas. Todas estas bases de "
+        "datos se complementan entre sí, ya que incluyen documentos de "
+        "diversas fuentes, incluyendo artículos de revistas y ponencias de "
+        "congresos."
+    ),
+    'keywords': (
+        "El proceso de revisión consiste en la elección de palabras clave, las "
+        "cuales surgen de la pregunta de investigación: {keywords_enum}."
+    ),
+    'search_period': (
+        "Las palabras clave permiten identificar sinónimos y términos "
+        "relacionados con el objeto de estudio, que al combinarse forman "
+        "la cadena de búsqueda, cuyo propósito es identificar artículos "
+        "relevantes para la investigación. El período de búsqueda de "
+        "publicaciones relevantes se realizó entre {anio_inicio} "
+        "y {anio_final}, debido a la "
+        "velocidad con la que se producen los cambios tecnológicos."
+    ),
+    'criteria_intro': (
+        "Una vez encontrados los documentos, se aplicaron criterios de inclusión y "
+        "exclusión para la preselección y selección de los artículos relevantes. Los "
+        "principales criterios de una revisión sistemática son los siguientes:"
+    ),
+    'execute': (
+        "El proceso de ejecución comienza con la aplicación de la cadena de "
+        "búsqueda inicial en bases de datos indexadas con el fin de refinar la cadena "
+        "y encontrar los artículos relevantes al objeto de estudio."
+    ),
+    'first_iteration': (
+        "Durante la primera iteración de búsqueda en las bases de datos bibliográficas "
+        "seleccionadas, el sistema obtuvo automáticamente el número de publicaciones "
+        "encontradas en cada fuente, de acuerdo con los criterios y el periodo "
+        "definidos por el usuario. Esta información inicial proporciona una visión "
+        "general del volumen de literatura disponible y constituye el punto de partida "
+        "para el proceso de selección y análisis de los artículos relevantes."
+    ),
+    'synonyms': (
+        "Después de una serie de pruebas y revisiones, se identificaron términos "
+        "relacionados y sus sinónimos, de tal manera que: {keywords_enum}."
+    ),
+    'search_string': (
+        "Por lo tanto, el modelo estándar de cadenas de búsqueda se expresa "
+        "de la siguiente manera: {cadena_busqueda}"
+    ),
+    'snowball': (
+        "Una vez aplicada la cadena de búsqueda refinada, "
+        "el sistema identificó automáticamente los estudios "
+        "primarios relevantes en cada base de datos seleccionada. "
+        "Para maximizar la exhaustividad de la revisión, también "
+        "se consideraron las referencias de los estudios encontrados, "
+        'empleando la técnica de búsqueda en "bola de nieve" '
+        "(Wohlin, 2014), con el objetivo de localizar artículos "
+        "adicionales pertinentes al objeto de estudio."
+    ),
+    'prisma': (
+        "Tal como se ilustra en la Figura 1, el sistema documenta detalladamente "
+        "el proceso de selección de artículos. Inicialmente, se identificaron "
+        "{initial_search} estudios potencialmente relevantes a través "
+        "de las bases de datos seleccionadas, y se identificaron {additional_sources} "
+        "estudios adicionales a través de otras fuentes. Después de eliminar {duplicates_removed} "
+        "artículo duplicado, quedaron {after_duplicates} artículos para la revisión de título "
+        "y resumen. De estos, {title_abstract_excluded} fueron "
+        "excluidos basándose en los criterios de inclusión y exclusión. "
+        "Los {full_text_assessed} artículos restantes fueron evaluados a texto completo, "
+        "de los cuales {full_text_excluded} fueron excluidos. Finalmente, {final_included} estudios cumplieron "
+        "con todos los criterios y fueron incluidos en la síntesis cuantitativa, "
+        "representando una tasa de selección del {selection_rate}%."
+    ),
+    'selection': (
+        "Finalmente, se obtuvieron {final_included} artículos para ser analizados en detalle. "
+        "Una primera aproximación de los estudios relevantes es su pre-selección; "
+        "primero, se descartaron los artículos cuyo idioma era diferente del inglés, "
+        "y luego se analizaron el título, el resumen y las palabras clave de cada artículo "
+        "para verificar si están relacionados con el objeto de estudio. Después de esta "
+        "evaluación, se eliminaron {full_text_excluded} artículos y se obtuvieron {final_included} artículos para su "
+        "revisión completa. Para la selección de artículos, se analizó a fondo el texto "
+        "completo para determinar si el artículo estaba estrechamente relacionado con "
+        "el objeto de estudio, o si se desarrolló una aplicación que pudiera verificar "
+        "la construcción de una herramienta como requisito mínimo para la selección. "
+        "Para evitar la subjetividad, las actividades de revisión de artículos y "
+        "extracción de datos se realizaron de manera independiente. "
+        "Si un artículo no fue incluido, se mencionó el motivo de su exclusión. "
+        "Con este análisis, se eliminaron {full_text_excluded} "
+        "artículos, resultando en {final_included} estudios "
+        "utilizados para la extracción de datos."
+    ),
+}
+
+def _estimate_max_tokens(target_words):
+    """max_tokens para una respuesta de target_words palabras (~1.6 tokens por palabra en español, más margen)"""
+    return int(target_words * 1.6) + 80
+
+
+# Palabras que piden los prompts de cada sección y su límite de tokens de salida
+AI_SECTION_WORDS = {
+    'abstract': 250,
+    'introduction': 700,  # "500-700 palabras"
+    'results': 120,  # "100-120 palabras"
+    'rsq': 400,  # Cuatro apartados de ~100 palabras
+    'analysis': 1500,  # "1000-1500 palabras"
+    'conclusions': 250,  # Tres conclusiones en un párrafo
+}
+AI_SECTION_MAX_TOKENS = {section: _estimate_max_tokens(words) for section, words in AI_SECTION_WORDS.items()}
+AI_STOP_SEQUENCES = ["\n\n\n"]  # Cortar la respuesta si el modelo empieza a rellenar con líneas vacías
+
+# Campos de cada artículo en la tabla de extracción: (etiqueta, clave, valor por defecto)
+EXTRACTION_TABLE_FIELDS = (
+    ("Titulo", 'titulo', 'N/A'),
+    ("Autor", 'autores', 'N/A'),
+    ("Publicacion", 'journal', 'N/A'),
+    ("Año", 'anio_publicacion', 'N/A'),
+    ("Tipo de técnica:", 'respuesta_subpregunta_1', 'Sin respuesta'),
+    ("Tipo de registro:", 'respuesta_subpregunta_2', 'Sin respuesta'),
+    ("Tipo de limitaciones:", 'respuesta_subpregunta_3', 'Sin respuesta'),
+)
+
+# Anchos de columna de la tabla de extracción: ID, nombres de campos y datos del artículo
+EXTRACTION_TABLE_COL_WIDTHS = (0.5 * inch, 1.3 * inch, 5.2 * inch)
+
+# Estilos de la tabla de extracción que no dependen del número de artículos
+EXTRACTION_TABLE_STYLE = [
+    # Estilo para el encabezado principal (primera fila, combina las 3 columnas)
+    ('SPAN', (0, 0), (2, 0)),  # Combinar las 3 columnas de la primera fila
+    ('BACKGROUND', (0, 0), (2, 0), colors.lightgrey),
+    ('TEXTCOLOR', (0, 0), (2, 0), colors.black),
+    ('ALIGN', (0, 0), (2, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (2, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (2, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (2, 0), 8),
+    ('TOPPADDING', (0, 0), (2, 0), 8),
+    
+    # Estilo para la columna ID (un solo rango para todos los artículos)
+    ('BACKGROUND', (0, 1), (0, -1), colors.white),
+    ('TEXTCOLOR', (0, 1), (0, -1), colors.black),
+    ('ALIGN', (0, 1), (0, -1), 'CENTER'),
+    ('VALIGN', (0, 1), (0, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 1), (0, -1), 14),
+    
+    # Estilo para la segunda columna (nombres de campos)
+    ('BACKGROUND', (1, 1), (1, -1), colors.lightgrey),
+    ('TEXTCOLOR', (1, 1), (1, -1), colors.black),
+    ('ALIGN', (1, 1), (1, -1), 'LEFT'),
+    ('VALIGN', (1, 1), (1, -1), 'TOP'),
+    
+    # Estilo para la tercera columna (datos del artículo)
+    ('BACKGROUND', (2, 1), (2, -1), colors.white),
+    ('TEXTCOLOR', (2, 1), (2, -1), colors.black),
+    ('ALIGN', (2, 1), (2, -1), 'LEFT'),
+    ('VALIGN', (2, 1), (2, -1), 'TOP'),
+    
+    # Bordes para toda la tabla
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('LINEBELOW', (0, 0), (-1, 0), 2, colors.black),  # Línea más gruesa bajo encabezado
+    ('LINEAFTER', (0, 1), (0, -1), 2, colors.black),  # Línea más gruesa después de columna ID
+    ('LINEAFTER', (1, 1), (1, -1), 2, colors.black),  # Línea más gruesa después de nombres de campos
+    
+    # Padding optimizado
+    ('LEFTPADDING', (0, 0), (-1, -1), 8),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+]
+
+# Textos de respaldo por sección cuando OpenAI no está disponible o la llamada falla
+AI_FALLBACK_TEXTS = {
+    'abstract': "Este estudio presenta un mapeo sistemático de la literatura sobre el tema de investigación. "
+                "Se describen los objetivos, la metodología de búsqueda y selección de estudios, y los "
+                "principales hallazgos obtenidos a partir de los artículos seleccionados.",
+    'introduction': "Esta sección presenta el contexto del tema de investigación, las preguntas que guían el "
+                    "mapeo sistemático y las contribuciones esperadas del estudio.",
+    'results': "A continuación se presentan los resultados obtenidos a partir de los estudios seleccionados, "
+               "organizados según las preguntas de investigación planteadas.",
+    'rsq': "Las respuestas registradas para esta pregunta se resumen en la tabla correspondiente.",
+    'analysis': "Los resultados obtenidos se analizan en relación con las preguntas de investigación "
+                "planteadas y con los patrones identificados en los estudios seleccionados.",
+    'conclusions': "El mapeo sistemático permitió identificar y organizar la evidencia disponible sobre el tema "
+                   "de investigación y señalar líneas de trabajo futuro.",
+}
+
+PRISMA_CACHE_SIZE = 32  # Cantidad de conjuntos de artículos con datos PRISMA en memoria
+# Campos que lee _extract_real_prisma_data (estado, fuente, título del que infiere la fuente y fechas)
+PRISMA_KEY_FIELDS = (
+    'id', 'estado', 'titulo', 'fuente', 'base_datos', 'source', 'database', 'origen',
+    'fecha_agregado', 'fecha_creacion', 'created_at', 'fecha',
+)
+_prisma_cache = {}
+_prisma_cache_lock = threading.Lock()  # Los reportes en segundo plano (report_jobs) corren en varios hilos
+
+TITLE_STOP_WORDS = frozenset({'a', 'an', 'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'})
+MAX_TITLE_KEYWORDS = 6
+
+# Patrones compilados una sola vez para el análisis de respuestas y la limpieza del texto de la IA
+RESPONSE_WORD_RE = re.compile(r'\b[a-zA-ZáéíóúñüÁÉÍÓÚÑÜ]{3,}\b')
+RESPONSE_STOP_WORDS = frozenset({'el', 'la', 'de', 'que', 'y', 'a', 'en', 'un', 'es', 'se', 'no', 'te', 'lo', 'le', 'da', 'su', 'por', 'son', 'con', 'para', 'al', 'del', 'los', 'las', 'una', 'su', 'este', 'esta', 'como', 'más', 'pero', 'sus', 'muy', 'sin', 'sobre', 'entre', 'ser', 'estar', 'hacer', 'the', 'of', 'and', 'to', 'in', 'is', 'it', 'you', 'that', 'he', 'was', 'for', 'on', 'are', 'as', 'with', 'his', 'they', 'i', 'at', 'be', 'this', 'have', 'from', 'or', 'one', 'had', 'by', 'word', 'but', 'not', 'what', 'all', 'were', 'we', 'when', 'your', 'can', 'said', 'there', 'each', 'which', 'she', 'do', 'how', 'their', 'if', 'will', 'up', 'other', 'about', 'out', 'many', 'then', 'them', 'these', 'so', 'some', 'her', 'would', 'make', 'like', 'into', 'him', 'has', 'two', 'more', 'much', 'my', 'way', 'been', 'who', 'its', 'now', 'find', 'long', 'down', 'day', 'did', 'get', 'come', 'made', 'may', 'part'})
+# Palabras clave y categoría por subpregunta: 1 métodos/enfoques, 2 aplicaciones/dominios, 3 limitaciones/futuro
+SUBQUESTION_CATEGORIES = {
+    1: (('machine', 'learning', 'algorithm', 'statistical', 'analysis', 'model', 'approach', 'method', 'technique',
+         'algoritmo', 'análisis', 'método', 'técnica', 'estadístico'), 'Técnicas y Métodos'),
+    2: (('health', 'medical', 'clinical', 'diagnostic', 'treatment', 'patient', 'disease', 'salud', 'médico',
+         'clínico', 'diagnóstico', 'tratamiento', 'paciente', 'enfermedad'), 'Aplicaciones Médicas'),
+    3: (('limitation', 'challenge', 'future', 'recommendation', 'improvement', 'limitación', 'desafío', 'futuro',
+         'recomendación', 'mejora'), 'Limitaciones y Futuro'),
+}
+SUBQUESTION_KEYWORDS_RE = {
+    number: re.compile('|'.join(map(re.escape, keywords)), re.IGNORECASE)
+    for number, (keywords, _) in SUBQUESTION_CATEGORIES.items()
+}
+# Términos que se cuentan en el análisis de patrones de cada RSQ (el orden desempata el ranking)
+PATTERN_KEY_TERMS = {
+    'techniques': ('machine learning', 'deep learning', 'algorithm', 'statistical', 'neural network',
+                   'regression', 'classification', 'clustering', 'ai', 'artificial intelligence',
+                   'aprendizaje automático', 'algoritmo', 'estadístico', 'inteligencia artificial'),
+    'applications': ('healthcare', 'medical', 'clinical', 'diagnostic', 'treatment', 'patient',
+                     'disease', 'health', 'salud', 'médico', 'clínico', 'diagnóstico', 'tratamiento'),
+    'limitations': ('limitation', 'challenge', 'problem', 'issue', 'future work', 'improvement',
+                    'limitación', 'desafío', 'problema', 'trabajo futuro', 'mejora'),
+}
+# Una sola alternancia por categoría (términos largos primero para que 'healthcare' gane a 'health')
+PATTERN_KEY_TERMS_RE = {
+    category: re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    for category, terms in PATTERN_KEY_TERMS.items()
+}
+BY_COUNT = itemgetter(1)  # Clave de orden de los pares (término, conteo)
+SECTION_NUMBER_RE = re.compile(r'^3\.\d+\s*')  # Numeración automática (3.1, 3.2, ...) al inicio de un párrafo
+
+ROMAN_NUMERALS = ('I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X')  # Enumeración de keywords (máximo MAX_TITLE_KEYWORDS)
+
+PDF_WRITE_BUFFER_SIZE = 64 * 1024  # Buffer de escritura cuando el reporte se guarda en disco
+PDF_DOC_OPTIONS = {'pagesize': A4, 'topMargin': inch, 'bottomMargin': inch}  # Configuración de página de todos los reportes
+IMAGE_DPI = 150  # Resolución con la que se incrustan las figuras en el PDF
+IMAGE_CACHE_SIZE = 64  # Figuras ya reducidas que se guardan en memoria (LRU)
+IMAGE_SHARED_CACHE_TIMEOUT = 7 * 86400  # Figuras reducidas en la cache de Django, compartidas entre procesos
+_image_cache = OrderedDict()
+_image_cache_lock = threading.Lock()  # get + move_to_end y la inserción con desalojo deben ser atómicos
+
+
+@dataclass
+class ArticleStats:
+    """Datos de los artículos calculados en una sola pasada y compartidos por las secciones"""
+    selected: list  # Artículos con estado SELECTED, en el orden original
+    year_hist: Counter  # Artículos por año de publicación (todos los artículos)
+    total: int
+
+
+def _downscale_base64_image(base64_string, max_size_px):
+    """Decodificar una figura base64 y reducirla con Pillow; el resultado se guarda por su hash"""
+    # Se codifica una sola vez: el hash y b64decode trabajan sobre los mismos bytes
+    encoded = memoryview(base64_string.encode('ascii'))
+    # Las figuras del frontend pueden llegar como data URL ("data:image/png;base64,..."); se recorta sin copiar
+    if base64_string.startswith('data:'):
+        encoded = encoded[base64_string.index(',') + 1:]
+    key = (hashlib.blake2b(encoded, digest_size=16).hexdigest(), max_size_px)
+    with _image_cache_lock:
+        image_bytes = _image_cache.get(key)
+        if image_bytes is not None:
+            _image_cache.move_to_end(key)
+            return image_bytes
+    
+    # Segundo nivel: otro proceso (u otro reinicio, con Redis) ya pudo reducir la misma figura
+    shared_key = f"sms:img:{key[0]}:{max_size_px[0]}x{max_size_px[1]}"
+    image_bytes = cache.get(shared_key)
+    if image_bytes is None:
+        decoded = base64.b64decode(encoded)
+        with PILImage.open(io.BytesIO(decoded)) as img:
+            if img.width <= max_size_px[0] and img.height <= max_size_px[1]:
+                image_bytes = decoded  # Ya cabe en el espacio disponible: no se vuelve a codificar
+            else:
+                img.thumbnail(max_size_px, PILImage.LANCZOS)
+                output = io.BytesIO()
+                img.save(output, format='PNG', optimize=True)
+                image_bytes = output.getvalue()
+                # Solo se comparte el resultado costoso; decodificar el base64 original es barato
+                cache.set(shared_key, image_bytes, timeout=IMAGE_SHARED_CACHE_TIMEOUT)
+    
+    with _image_cache_lock:  # La reducción se hace sin el lock; dos hilos con la misma figura guardan el mismo resultado
+        _image_cache[key] = image_bytes
+        if len(_image_cache) > IMAGE_CACHE_SIZE:
+            _image_cache.popitem(last=False)  # Descartar la figura usada hace más tiempo
+    return image_bytes
+
+
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None  # httpx necesita h2 para HTTP/2
+AI_HTTP_MAX_CONNECTIONS = 50  # Conexiones abiertas con OpenAI durante la precarga en paralelo
+AI_HTTP_TIMEOUT = 60.0
+AI_HTTP_CONNECT_TIMEOUT = 10.0
+
+
+@functools.lru_cache(maxsize=None)
+def _load_openai():
+    """Importar OpenAI solo al configurar el primer cliente (None si no está instalado)"""
+    try:
+        import openai
+    except ImportError as e:
+        logger.warning("OpenAI not installed: %s", e)
+        return None
+    logger.debug("OpenAI library imported successfully")
+    return openai
+
+@functools.lru_cache(maxsize=None)
+def _get_openai_api_key():
+    """
+    Clave de OpenAI leída una sola vez por proceso: primero de Django settings y luego
+    de las variables de entorno (settings.py ya cargó el .env al iniciar).
+    """
+    api_key = getattr(settings, 'OPENAI_API_KEY', '')
+    if api_key:
+        logger.debug("Clave encontrada en Django settings (longitud: %d)", len(api_key))
+        return api_key
+    logger.warning("No se encontró clave en Django settings")
+    api_key = os.environ.get('OPENAI_API_KEY', '')
+    if api_key:
+        logger.debug("Clave encontrada en variables de entorno (longitud: %d)", len(api_key))
+    else:
+        logger.error("No se encontró clave en variables de entorno")
+    return api_key
+
+def _http_client_options():
+    """Pool de conexiones de httpx para los clientes OpenAI (HTTP/2 solo si h2 está instalado)"""
+    import httpx  # Dependencia de openai, se importa junto con él
+    return {
+        'http2': HTTP2_AVAILABLE,
+        'limits': httpx.Limits(max_connections=AI_HTTP_MAX_CONNECTIONS, max_keepalive_connections=AI_HTTP_MAX_CONNECTIONS),
+        'timeout': httpx.Timeout(AI_HTTP_TIMEOUT, connect=AI_HTTP_CONNECT_TIMEOUT),
+    }
+
+@functools.lru_cache(maxsize=None)
+def _get_openai_client(api_key):
+    """Cliente OpenAI síncrono compartido por todas las instancias del servicio"""
+    import httpx
+    return _load_openai().OpenAI(api_key=api_key, http_client=httpx.Client(**_http_client_options()))
+
+def _run_coroutine(coro):
+    """
+    Ejecutar una corrutina desde código síncrono. Si el hilo ya tiene un event loop
+    activo (servidor ASGI), asyncio.run fallaría, así que se ejecuta en un hilo aparte.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+class _RequestLimiter:
+    """
+    Cubetas de solicitudes y tokens por minuto para las llamadas a OpenAI
+    (mismo esquema que api_request_parallel_processor.py del openai-cookbook).
+    Se crea una por precarga porque el asyncio.Lock queda ligado a su event loop.
+    """
+    
+    def __init__(self, max_requests_per_minute, max_tokens_per_minute):
+        self.max_requests = max_requests_per_minute
+        self.max_tokens = max_tokens_per_minute
+        self.requests_available = max_requests_per_minute
+        self.tokens_available = max_tokens_per_minute
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.requests_available = min(self.max_requests, self.requests_available + self.max_requests * elapsed / 60)
+        self.tokens_available = min(self.max_tokens, self.tokens_available + self.max_tokens * elapsed / 60)
+    
+    async def acquire(self, tokens):
+        """Esperar hasta que haya capacidad para una solicitud de `tokens` tokens"""
+        tokens = min(tokens, self.max_tokens)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.requests_available >= 1 and self.tokens_available >= tokens:
+                    self.requests_available -= 1
+                    self.tokens_available -= tokens
+                    return
+                await asyncio.sleep(max(
+                    (1 - self.requests_available) * 60 / self.max_requests,
+                    (tokens - self.tokens_available) * 60 / self.max_tokens
+                ))
 
 class EnhancedReportGeneratorService:
     """
@@ -30,116 +553,139 @@ class EnhancedReportGeneratorService:
     integrando las visualizaciones existentes del sistema y análisis con IA.
     """
     
-    def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self._setup_custom_styles()
+    AI_MODEL = "gpt-3.5-turbo"  # Secciones analíticas largas
+    AI_SMALL_MODEL = "gpt-4o-mini"  # Secciones cortas: más rápido y barato
+    AI_SMALL_MODEL_MAX_TOKENS = 800  # Hasta este max_tokens un prompt se considera corto
+    AI_TEMPERATURE = 0.7
+    AI_SMALL_MODEL_TEMPERATURE = 0.2  # Respuestas más estables en las secciones cortas
+    AI_SYSTEM_PROMPT = AI_SYSTEM_PREAMBLE  # Mensaje de sistema idéntico en todas las llamadas
+    AI_MAX_CONCURRENCY = 8  # Solicitudes simultáneas a OpenAI durante la precarga
+    AI_CACHE_TIMEOUT = 30 * 86400  # Respuestas de OpenAI guardadas 30 días (prompts idénticos no se vuelven a pagar)
+    AI_BATCH_SECTION_MAX_TOKENS = 800  # Solo las secciones cortas se agrupan en una sola solicitud JSON
+    AI_BATCH_MAX_TOKENS = 4000  # Límite de tokens de salida de la solicitud agrupada
+    AI_MAX_REQUESTS_PER_MINUTE = 500  # Límites conservadores por defecto (por debajo del primer nivel de OpenAI)
+    AI_MAX_TOKENS_PER_MINUTE = 90000
+    AI_MAX_ATTEMPTS = 5  # Intentos por solicitud ante 429, 5xx o errores de conexión
+    AI_MAX_BACKOFF = 30  # Espera máxima (segundos) entre reintentos
+    AI_BATCH_API_TIMEOUT = 600  # Segundos que se espera un trabajo de la Batch API antes de cancelarlo
+    AI_BATCH_API_POLL_INTERVAL = 10  # Segundos entre consultas del estado del trabajo
+    AI_EMBEDDING_MODEL = "text-embedding-3-small"  # Embeddings baratos para la cache semántica
+    AI_SEMANTIC_CACHE_THRESHOLD = 0.85  # Similitud coseno mínima para reutilizar una respuesta
+    AI_SEMANTIC_CACHE_SIZE = 500  # Respuestas conservadas en el índice semántico de cada SMS
+    AI_SEMANTIC_CACHE_KEY = "sms:ai:semantic"  # Prefijo; el índice se guarda por id de SMS
+    
+    _styles_cache = None  # Hoja de estilos compartida por todas las instancias
+    
+    def __init__(self, max_requests_per_minute=None, max_tokens_per_minute=None, use_batch_api=None):
+        self.styles = type(self)._shared_styles()
+        self.max_requests_per_minute = max_requests_per_minute or self.AI_MAX_REQUESTS_PER_MINUTE
+        self.max_tokens_per_minute = max_tokens_per_minute or self.AI_MAX_TOKENS_PER_MINUTE
+        # Batch API: mitad de costo, más latencia. Los trabajos en segundo plano pueden activarla
+        # aunque la configuración global (OPENAI_USE_BATCH_API) la tenga apagada
+        if use_batch_api is None:
+            use_batch_api = getattr(settings, 'OPENAI_USE_BATCH_API', False)
+        self.use_batch_api = use_batch_api
+        self.use_semantic_cache = getattr(settings, 'OPENAI_SEMANTIC_CACHE', False)  # Reutilizar respuestas de prompts parecidos
         
         # Configurar OpenAI con debugging mejorado
         self.client = None
+        self.api_key = None
+        self._ai_texts = {}  # Textos precargados en paralelo, indexados por prompt
+        self._stats = None  # ArticleStats del reporte en curso
+        self._stats_source = None  # Lista de artículos a la que corresponde self._stats
+        self._detailed_stats = None  # Resultado de _extract_detailed_statistics para self._stats_source
+        self._rsq_patterns = None  # Resultado de _extract_rsq_patterns_analysis para self._detailed_stats
+        self._subquestion_analyses = {}  # _analyze_subquestion_responses por número de pregunta del reporte en curso
+        self._semantic_cache_key = None  # Índice semántico del SMS en curso (None: no se usa la cache semántica)
+        self._image_buffers = []  # Buffers de las figuras del reporte en curso, se cierran tras doc.build
         self.openai_status = self._setup_openai_client()
         
     def _setup_openai_client(self):
         """Configurar cliente OpenAI con debugging detallado"""
-        print("🔍 Iniciando configuración de OpenAI...")
+        logger.debug("Iniciando configuración de OpenAI...")
         
-        if not OPENAI_AVAILABLE:
-            print("❌ OpenAI library no disponible")
+        if _load_openai() is None:
+            logger.error("OpenAI library no disponible")
             return "library_not_available"
         
-        # Método 1: Desde settings de Django
-        api_key = getattr(settings, 'OPENAI_API_KEY', '')
-        if api_key:
-            print(f"✅ Clave encontrada en Django settings (longitud: {len(api_key)})")
-        else:
-            print("⚠️ No se encontró clave en Django settings")
-            
-            # Método 2: Directamente desde variables de entorno
-            api_key = os.environ.get('OPENAI_API_KEY', '')
-            if api_key:
-                print(f"✅ Clave encontrada en variables de entorno (longitud: {len(api_key)})")
-            else:
-                print("❌ No se encontró clave en variables de entorno")
-        
-        # Método 3: Desde archivo .env (manual)
+        api_key = _get_openai_api_key()
         if not api_key:
-            try:
-                from dotenv import load_dotenv
-                load_dotenv()
-                api_key = os.environ.get('OPENAI_API_KEY', '')
-                if api_key:
-                    print(f"✅ Clave encontrada después de cargar .env (longitud: {len(api_key)})")
-                else:
-                    print("❌ No se encontró clave después de cargar .env")
-            except ImportError:
-                print("⚠️ python-dotenv no instalado")
-        
-        if not api_key:
-            print("❌ No se encontró clave API de OpenAI en ningún método")
+            logger.error("No se encontró clave API de OpenAI en ningún método")
             return "no_api_key"
         
         # Validar formato de la clave
         if not api_key.startswith('sk-'):
-            print(f"⚠️ Formato de clave inválido. Debe comenzar con 'sk-', actual: {api_key[:10]}...")
+            logger.warning("Formato de clave inválido. Debe comenzar con 'sk-', actual: %s...", api_key[:10])
             return "invalid_key_format"
         
         if len(api_key) < 40:
-            print(f"⚠️ Clave parece incompleta. Longitud: {len(api_key)}, esperada: ~51")
+            logger.warning("Clave parece incompleta. Longitud: %s, esperada: ~51", len(api_key))
             return "key_too_short"
         
         # Intentar crear el cliente
         try:
-            self.client = OpenAI(api_key=api_key)
-            print("✅ Cliente OpenAI creado exitosamente")
-            
-            # Test básico de conectividad
-            try:
-                test_response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": "Test"}],
-                    max_tokens=5
-                )
-                print("✅ Test de conectividad OpenAI exitoso")
-                return "configured_and_tested"
-            except Exception as test_error:
-                print(f"⚠️ Cliente creado pero test falló: {test_error}")
-                return "client_created_but_test_failed"
+            self.client = _get_openai_client(api_key)
+            self.api_key = api_key
+            logger.debug("Cliente OpenAI creado exitosamente")
+            # Sin llamada de prueba: la clave se valida en la primera solicitud real (_check_auth_error)
+            return "configured"
                 
         except Exception as e:
-            print(f"❌ Error creando cliente OpenAI: {e}")
+            logger.error("Error creando cliente OpenAI: %s", e)
             self.client = None
             return f"client_creation_failed: {str(e)}"
     
-    def _setup_custom_styles(self):
+    def _check_auth_error(self, error):
+        """Si OpenAI rechaza la clave, desactivar el cliente para no repetir llamadas que fallarán"""
+        openai = _load_openai()
+        if self.client and isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError)):
+            logger.error("OpenAI rechazó la clave API: %s", error)
+            self.client = None
+            self.openai_status = f"client_creation_failed: {error}"
+    
+    @classmethod
+    def _shared_styles(cls):
+        """Construir getSampleStyleSheet() y los estilos propios una sola vez por proceso"""
+        if cls._styles_cache is None:
+            styles = getSampleStyleSheet()
+            cls._setup_custom_styles(styles)
+            cls._styles_cache = styles
+        return cls._styles_cache
+    
+    @staticmethod
+    def _setup_custom_styles(styles):
         """Configurar estilos personalizados para el documento"""
-        self.styles.add(ParagraphStyle(
+        if 'CustomTitle' in styles:  # add() lanza KeyError si el estilo ya existe
+            return
+        styles.add(ParagraphStyle(
             name='CustomTitle',
-            parent=self.styles['Heading1'],
+            parent=styles['Heading1'],
             fontSize=16,
             spaceAfter=12,
             textColor=colors.HexColor('#2563eb'),
             alignment=TA_CENTER
         ))
         
-        self.styles.add(ParagraphStyle(
+        styles.add(ParagraphStyle(
             name='CustomHeading2',
-            parent=self.styles['Heading2'],
+            parent=styles['Heading2'],
             fontSize=14,
             spaceAfter=10,
             textColor=colors.HexColor('#1f2937')
         ))
         
-        self.styles.add(ParagraphStyle(
+        styles.add(ParagraphStyle(
             name='CustomNormal',
-            parent=self.styles['Normal'],
+            parent=styles['Normal'],
             fontSize=11,
             alignment=TA_JUSTIFY,
             spaceAfter=12
         ))
         
         # NUEVO ESTILO para encabezados de tabla
-        self.styles.add(ParagraphStyle(
+        styles.add(ParagraphStyle(
             name='CustomHeading5',
-            parent=self.styles['Normal'],
+            parent=styles['Normal'],
             fontSize=10,
             fontName='Helvetica-Bold',
             textColor=colors.black,
@@ -148,7 +694,7 @@ class EnhancedReportGeneratorService:
             spaceBefore=0
         ))
     
-    def generate_comprehensive_report(self, sms_data, articles_data, visualizations_data=None):
+    def generate_comprehensive_report(self, sms_data, articles_data, visualizations_data=None, output_stream=None):
         """
         Genera un reporte metodológico completo incluyendo visualizaciones
         
@@ -156,132 +702,475 @@ class EnhancedReportGeneratorService:
             sms_data: Datos del SMS
             articles_data: Lista de artículos procesados
             visualizations_data: Datos de las visualizaciones (opcional)
+            output_stream: Objeto con write() o ruta de archivo donde se escribe el PDF (opcional).
+                Si se indica, el PDF se escribe ahí y se devuelve None;
+                si no, se devuelven los bytes del PDF.
         """
-        print(f"📄 Generando reporte completo. Estado OpenAI: {self.openai_status}")
-        
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=inch, bottomMargin=inch)
-        
-        story = []
-        
-        # 1. Portada y Abstract
-        story.extend(self._generate_title_and_abstract(sms_data))
-        
-        # 2. Introducción con citas
-        story.extend(self._generate_introduction(sms_data, articles_data))
-        
-        # 3. Metodología detallada (A. Planning + c)
-        story.extend(self._generate_detailed_methodology(sms_data, articles_data, visualizations_data))
-        
-        # 4. NUEVA SECCIÓN: C. Results mejorada con IA
-        story.extend(self._generate_comprehensive_results_section(sms_data, articles_data, visualizations_data))
-
-        # 5. Tabla de extracción de información (NUEVA POSICIÓN)
-        story.extend(self._generate_information_extraction_table(articles_data))
+        if output_stream is None:
+            buffer = io.BytesIO()
+            self.generate_comprehensive_report(sms_data, articles_data, visualizations_data, output_stream=buffer)
+            return buffer.getvalue()
+        if isinstance(output_stream, (str, os.PathLike)):
+            # Escritura a disco con buffer de 64 KB en lugar de muchas escrituras pequeñas
+            with open(output_stream, 'wb', buffering=PDF_WRITE_BUFFER_SIZE) as pdf_file:
+                self.generate_comprehensive_report(sms_data, articles_data, visualizations_data, output_stream=pdf_file)
+            return None
+        
+        logger.debug("Generando reporte completo. Estado OpenAI: %s", self.openai_status)
+        
+        # Recorrer los artículos una sola vez para todas las secciones
+        self._stats = self._compute_article_stats(articles_data)
+        self._stats_source = articles_data
+        self._detailed_stats = None
+        self._rsq_patterns = None
+        self._subquestion_analyses = {}
+        self._semantic_cache_key = self._semantic_cache_key_for(sms_data)
+        
+        # Lanzar todas las llamadas a OpenAI en paralelo antes de armar el documento
+        self._ai_texts = {}
+        if self.client:
+            prompts = self._collect_ai_prompts(sms_data, articles_data)
+            self._ai_texts = _run_coroutine(self._prefetch_ai_texts(prompts))
+            logger.debug("Textos precargados en paralelo: %s/%s", len(self._ai_texts), len(prompts))
+        
+        doc = SimpleDocTemplate(output_stream, **PDF_DOC_OPTIONS)
+        
+        # Cada sección es un generador; se encadenan para no crear una lista intermedia por sección
+        sections = [
+            # 1. Portada y Abstract
+            self._generate_title_and_abstract(sms_data),
+            # 2. Introducción con citas
+            self._generate_introduction(sms_data, articles_data),
+            # 3. Metodología detallada (A. Planning + c)
+            self._generate_detailed_methodology(sms_data, articles_data, visualizations_data),
+            # 4. NUEVA SECCIÓN: C. Results mejorada con IA
+            self._generate_comprehensive_results_section(sms_data, articles_data, visualizations_data),
+            # 5. Tabla de extracción de información (NUEVA POSICIÓN)
+            self._generate_information_extraction_table(articles_data),
+            # 6. NUEVA SECCIÓN: Analysis and discussions
+            self._generate_analysis_and_discussions_section(sms_data, articles_data, visualizations_data),
+        ]
         
-        # 6. NUEVA SECCIÓN: Analysis and discussions (AGREGAR AQUÍ)
-        story.extend(self._generate_analysis_and_discussions_section(sms_data, articles_data, visualizations_data))
-
         # 6. Visualizaciones integradas
         if visualizations_data:
-            story.extend(self._integrate_visualizations(visualizations_data, sms_data))
+            sections.append(self._integrate_visualizations(visualizations_data, sms_data))
         
-        # 7. Conclusiones
-        story.extend(self._generate_conclusions(sms_data, articles_data))
+        # 7. Conclusiones y 8. Referencias bibliográficas
+        sections.append(self._generate_conclusions(sms_data, articles_data))
+        sections.append(self._generate_references(articles_data))
         
-        # 8. Referencias bibliográficas
-        story.extend(self._generate_references(articles_data))
+        # SimpleDocTemplate necesita una lista, se materializa una sola vez
+        story = list(chain.from_iterable(sections))
 
-        doc.build(story)
-        buffer.seek(0)
-        return buffer.read()
+        try:
+            doc.build(story)
+        finally:
+            # Liberar los bytes de las figuras apenas termina el armado del PDF
+            for image_buffer in self._image_buffers:
+                image_buffer.close()
+            self._image_buffers.clear()
+    
+    def _compute_article_stats(self, articles_data):
+        """Seleccionados e histograma de años en una sola pasada sobre los artículos"""
+        selected = []
+        year_hist = Counter()
+        for article in articles_data:
+            if article.get('estado') == 'SELECTED':
+                selected.append(article)
+            year_hist[article.get('anio_publicacion', 'Desconocido')] += 1
+        return ArticleStats(selected=selected, year_hist=year_hist, total=len(articles_data))
+    
+    def _get_article_stats(self, articles_data):
+        """ArticleStats del reporte en curso, o calculadas al vuelo si se llama con otros artículos"""
+        if self._stats is not None and self._stats_source is articles_data:
+            return self._stats
+        return self._compute_article_stats(articles_data)
+    
+    def _build_chat_messages(self, prompt):
+        """Mensajes enviados a OpenAI para un prompt"""
+        return [
+            {"role": "system", "content": self.AI_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _model_params(self, max_tokens):
+        """Modelo, temperatura y secuencias de corte según el tamaño de la sección pedida"""
+        if max_tokens <= self.AI_SMALL_MODEL_MAX_TOKENS:
+            return {"model": self.AI_SMALL_MODEL, "temperature": self.AI_SMALL_MODEL_TEMPERATURE, "stop": AI_STOP_SEQUENCES}
+        return {"model": self.AI_MODEL, "temperature": self.AI_TEMPERATURE, "stop": AI_STOP_SEQUENCES}
+    
+    def _ai_cache_key(self, prompt, max_tokens):
+        """Clave de cache de una respuesta: hash del modelo, el sistema, el prompt y max_tokens"""
+        digest = hashlib.sha256(
+            f"{self._model_params(max_tokens)['model']}|{self.AI_SYSTEM_PROMPT}|{prompt}|{max_tokens}".encode()
+        ).hexdigest()
+        return f"sms:ai:{digest}"
+    
+    def _collect_ai_prompts(self, sms_data, articles_data):
+        """Construir todos los prompts del reporte (son independientes entre sí)"""
+        stats = self._extract_detailed_statistics(articles_data)
+        prompts = [
+            (self._build_abstract_prompt(sms_data), AI_SECTION_MAX_TOKENS['abstract']),
+            (self._build_introduction_prompt(sms_data, articles_data), AI_SECTION_MAX_TOKENS['introduction']),
+            (self._build_results_introduction_prompt(sms_data, stats), AI_SECTION_MAX_TOKENS['results']),
+        ]
+        for i in range(1, 4):
+            subquestion_key = f'subpregunta_{i}'
+            if sms_data.get(subquestion_key):
+                prompts.append((self._build_rsq_analysis_prompt(i, sms_data[subquestion_key], stats), AI_SECTION_MAX_TOKENS['rsq']))
+        prompts.append((self._build_analysis_discussions_section_prompt(sms_data, articles_data, stats), AI_SECTION_MAX_TOKENS['analysis']))
+        prompts.append((self._build_conclusions_prompt(sms_data, articles_data), AI_SECTION_MAX_TOKENS['conclusions']))
+        return prompts
+    
+    async def _submit_with_backoff(self, client, limiter, prompt, max_tokens, model_max_tokens=None, **kwargs):
+        """
+        Llamar a OpenAI respetando los límites por minuto y reintentando con espera exponencial.
+        model_max_tokens elige el modelo cuando difiere de max_tokens (solicitud agrupada).
+        """
+        openai = _load_openai()
+        retryable = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+        token_estimate = len(prompt) // 4 + max_tokens  # Aproximación de ~4 caracteres por token
+        for attempt in range(self.AI_MAX_ATTEMPTS):
+            await limiter.acquire(token_estimate)
+            try:
+                return await client.chat.completions.create(
+                    messages=self._build_chat_messages(prompt),
+                    max_tokens=max_tokens,
+                    **self._model_params(model_max_tokens or max_tokens),
+                    **kwargs
+                )
+            except retryable as e:
+                if attempt == self.AI_MAX_ATTEMPTS - 1:
+                    raise
+                delay = min(2 ** attempt, self.AI_MAX_BACKOFF) + random.random() * 0.5
+                logger.warning("OpenAI respondió %s, reintento %s en %.1fs", type(e).__name__, attempt + 1, delay)
+                await asyncio.sleep(delay)
+    
+    async def _generate_ai_text_async(self, client, semaphore, limiter, prompt, max_tokens=500):
+        """Versión asíncrona de _generate_ai_text; devuelve None si la llamada falla"""
+        async with semaphore:
+            try:
+                response = await self._submit_with_backoff(client, limiter, prompt, max_tokens)
+                return response.choices[0].message.content.strip()
+            except Exception as e:
+                logger.error("Error en generación asíncrona con IA: %s", e)
+                self._check_auth_error(e)
+                return None
+    
+    def _split_batchable_prompts(self, prompts):
+        """Separar los prompts cortos que caben en una solicitud agrupada de los que van por separado"""
+        batched, single = [], []
+        budget = self.AI_BATCH_MAX_TOKENS
+        for prompt, max_tokens in prompts:
+            if max_tokens <= self.AI_BATCH_SECTION_MAX_TOKENS and max_tokens <= budget:
+                batched.append((prompt, max_tokens))
+                budget -= max_tokens
+            else:
+                single.append((prompt, max_tokens))
+        if len(batched) < 2:  # Agrupar una sola sección no ahorra nada
+            return [], prompts
+        return batched, single
+    
+    async def _generate_ai_batch_async(self, client, semaphore, limiter, prompts):
+        """Pedir varias secciones en una sola solicitud que responde un objeto JSON"""
+        if not prompts:
+            return {}
+        tasks = {f"seccion_{i}": prompt for i, (prompt, _) in enumerate(prompts, 1)}
+        batch_prompt = (
+            "Resuelve cada una de las siguientes tareas de forma independiente. "
+            "Responde únicamente con un objeto JSON cuyas claves sean exactamente "
+            f"{', '.join(tasks)} y cuyos valores sean el texto pedido en la tarea correspondiente.\n\n"
+            + "\n\n".join(f"### {key}\n{prompt.strip()}" for key, prompt in tasks.items())
+        )
+        async with semaphore:
+            try:
+                response = await self._submit_with_backoff(
+                    client, limiter, batch_prompt,
+                    sum(max_tokens for _, max_tokens in prompts),
+                    model_max_tokens=max(max_tokens for _, max_tokens in prompts),
+                    response_format={"type": "json_object"}
+                )
+                sections = json.loads(response.choices[0].message.content)
+            except Exception as e:
+                logger.error("Error en la solicitud agrupada de IA: %s", e)
+                return {}
+        return {
+            prompt: str(sections[key]).strip()
+            for key, prompt in tasks.items()
+            if isinstance(sections, dict) and sections.get(key)
+        }
+    
+    async def _generate_ai_texts_parallel(self, client, semaphore, limiter, prompts):
+        """Solicitudes en tiempo real: secciones cortas agrupadas en un JSON y el resto en paralelo"""
+        batched, single = self._split_batchable_prompts(prompts)
+        batch_texts, *texts = await asyncio.gather(
+            self._generate_ai_batch_async(client, semaphore, limiter, batched),
+            *[self._generate_ai_text_async(client, semaphore, limiter, prompt, max_tokens)
+              for prompt, max_tokens in single]
+        )
+        generated = {prompt: text for (prompt, _), text in zip(single, texts) if text}
+        generated.update(batch_texts)
+        # Las secciones que faltan en la respuesta agrupada se piden por separado
+        missing = [(prompt, max_tokens) for prompt, max_tokens in batched if prompt not in batch_texts]
+        if missing:
+            texts = await asyncio.gather(*[
+                self._generate_ai_text_async(client, semaphore, limiter, prompt, max_tokens)
+                for prompt, max_tokens in missing
+            ])
+            generated.update({prompt: text for (prompt, _), text in zip(missing, texts) if text})
+        return generated
+    
+    async def _generate_ai_batch_job_async(self, client, prompts):
+        """
+        Enviar los prompts como un trabajo de la Batch API de OpenAI (mitad de costo por token)
+        y esperar su resultado. Devuelve {} si el trabajo falla o no termina a tiempo.
+        """
+        lines = [
+            json.dumps({
+                "custom_id": f"prompt-{i}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "messages": self._build_chat_messages(prompt),
+                    "max_tokens": max_tokens,
+                    **self._model_params(max_tokens)
+                }
+            })
+            for i, (prompt, max_tokens) in enumerate(prompts)
+        ]
+        try:
+            batch_file = await client.files.create(
+                file=("report_prompts.jsonl", "\n".join(lines).encode()), purpose="batch"
+            )
+            job = await client.batches.create(
+                input_file_id=batch_file.id, endpoint="/v1/chat/completions", completion_window="24h"
+            )
+            logger.debug("Trabajo de Batch API creado: %s (%s prompts)", job.id, len(prompts))
+            deadline = time.monotonic() + self.AI_BATCH_API_TIMEOUT
+            while job.status not in ("completed", "failed", "expired", "cancelled"):
+                if time.monotonic() > deadline:
+                    logger.warning("La Batch API no terminó a tiempo, se usan solicitudes en tiempo real")
+                    await client.batches.cancel(job.id)
+                    return {}
+                await asyncio.sleep(self.AI_BATCH_API_POLL_INTERVAL)
+                job = await client.batches.retrieve(job.id)
+            if job.status != "completed" or not job.output_file_id:
+                logger.warning("Trabajo de Batch API terminado con estado %s", job.status)
+                return {}
+            output = await client.files.content(job.output_file_id)
+        except Exception as e:
+            logger.error("Error en la Batch API: %s", e)
+            return {}
+        
+        texts = {}
+        for line in output.text.splitlines():
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if response.get("status_code") == 200:
+                prompt = prompts[int(result["custom_id"].rsplit("-", 1)[1])][0]
+                texts[prompt] = response["body"]["choices"][0]["message"]["content"].strip()
+        logger.debug("Batch API: %s/%s textos recibidos", len(texts), len(prompts))
+        return texts
+    
+    def _semantic_cache_key_for(self, sms_data):
+        """
+        Clave del índice semántico del SMS: los prompts comparten casi todo el texto de las plantillas,
+        así que un índice global podría devolver el resumen de otro estudio (con su título y sus conteos).
+        """
+        sms_id = sms_data.get('id')
+        if sms_id is None:
+            return None  # Sin id no se puede acotar el índice a un estudio
+        return f"{self.AI_SEMANTIC_CACHE_KEY}:{sms_id}"
+    
+    async def _semantic_cache_lookup(self, client, prompts):
+        """
+        Buscar en el índice semántico respuestas de prompts parecidos (similitud coseno de embeddings).
+        Devuelve ({prompt: texto} de los aciertos, {prompt: (vector, max_tokens)} para guardar los nuevos).
+        """
+        try:
+            response = await client.embeddings.create(
+                model=self.AI_EMBEDDING_MODEL, input=[prompt for prompt, _ in prompts]
+            )
+        except Exception as e:
+            logger.warning("Cache semántica no disponible: %s", e)
+            return {}, {}
+        vectors = np.array([item.embedding for item in response.data], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)  # Normalizados: coseno = producto punto
+        
+        hits = {}
+        index = cache.get(self._semantic_cache_key)
+        if index is not None and index['vectors'].shape[1] == vectors.shape[1]:
+            similarities = vectors @ index['vectors'].T  # Una fila por prompt, una columna por respuesta guardada
+            for row, (prompt, max_tokens) in enumerate(prompts):
+                candidates = np.where(index['max_tokens'] == max_tokens, similarities[row], -1.0)
+                best = int(np.argmax(candidates))
+                if candidates[best] >= self.AI_SEMANTIC_CACHE_THRESHOLD:
+                    hits[prompt] = index['texts'][best]
+        if hits:
+            logger.debug("Cache semántica: %s/%s textos reutilizados", len(hits), len(prompts))
+        return hits, {prompt: (vectors[row], max_tokens) for row, (prompt, max_tokens) in enumerate(prompts)}
+    
+    def _semantic_cache_store(self, generated, prompt_vectors):
+        """Agregar las respuestas nuevas al índice semántico, conservando las más recientes"""
+        new = [(prompt_vectors[prompt], text) for prompt, text in generated.items() if prompt in prompt_vectors]
+        if not new:
+            return
+        vectors = np.stack([vector for (vector, _), _ in new])
+        max_tokens = np.array([tokens for (_, tokens), _ in new])
+        texts = [text for _, text in new]
+        index = cache.get(self._semantic_cache_key)
+        if index is not None and index['vectors'].shape[1] == vectors.shape[1]:
+            vectors = np.concatenate([index['vectors'], vectors])
+            max_tokens = np.concatenate([index['max_tokens'], max_tokens])
+            texts = index['texts'] + texts
+        size = self.AI_SEMANTIC_CACHE_SIZE
+        cache.set(
+            self._semantic_cache_key,
+            {'vectors': vectors[-size:], 'max_tokens': max_tokens[-size:], 'texts': texts[-size:]},
+            timeout=self.AI_CACHE_TIMEOUT
+        )
     
-    def _generate_ai_text(self, prompt, max_tokens=500):
+    async def _prefetch_ai_texts(self, prompts):
+        """Enviar todos los prompts a la vez con asyncio.gather (limitado por un semáforo)"""
+        # Las respuestas ya guardadas en cache no se vuelven a pedir
+        keys = {prompt: self._ai_cache_key(prompt, max_tokens) for prompt, max_tokens in prompts}
+        cached = cache.get_many(keys.values())
+        ai_texts = {prompt: cached[key] for prompt, key in keys.items() if key in cached}
+        logger.info(
+            "Cache de IA: %d/%d secciones reutilizadas (%.0f%%)",
+            len(ai_texts), len(keys), 100 * len(ai_texts) / len(keys) if keys else 0
+        )
+        prompts = [(prompt, max_tokens) for prompt, max_tokens in prompts if prompt not in ai_texts]
+        if not prompts:
+            return ai_texts
+        
+        # El cliente asíncrono queda ligado al event loop de asyncio.run, por eso se crea en cada precarga
+        # Los reintentos los maneja _submit_with_backoff, no el SDK
+        import httpx
+        client = _load_openai().AsyncOpenAI(
+            api_key=self.api_key, max_retries=0, http_client=httpx.AsyncClient(**_http_client_options())
+        )
+        semaphore = asyncio.Semaphore(self.AI_MAX_CONCURRENCY)
+        limiter = _RequestLimiter(self.max_requests_per_minute, self.max_tokens_per_minute)
+        try:
+            generated, prompt_vectors = {}, {}
+            if self.use_semantic_cache and self._semantic_cache_key:
+                # Prompts casi idénticos del mismo SMS (regenerado con otros datos menores) reutilizan la respuesta
+                hits, prompt_vectors = await self._semantic_cache_lookup(client, prompts)
+                ai_texts.update(hits)
+                prompts = [(prompt, max_tokens) for prompt, max_tokens in prompts if prompt not in hits]
+            if prompts and self.use_batch_api:
+                generated = await self._generate_ai_batch_job_async(client, prompts)
+                prompts = [(prompt, max_tokens) for prompt, max_tokens in prompts if prompt not in generated]
+            if prompts:
+                generated.update(await self._generate_ai_texts_parallel(client, semaphore, limiter, prompts))
+        finally:
+            await client.close()
+        # Los prompts que fallaron se reintentan de forma secuencial en _generate_ai_text
+        cache.set_many(
+            {keys[prompt]: text for prompt, text in generated.items()}, timeout=self.AI_CACHE_TIMEOUT
+        )
+        if prompt_vectors and generated:
+            self._semantic_cache_store(generated, prompt_vectors)
+        ai_texts.update(generated)
+        return ai_texts
+    
+    def _generate_section_text(self, section, build_prompt, *args):
+        """Texto de IA de una sección; sin cliente se usa el respaldo sin construir el prompt"""
+        if not self.client:
+            logger.warning("Cliente no disponible. Status: %s", self.openai_status)
+            return self._generate_academic_fallback_text(section)
+        return self._generate_ai_text(build_prompt(*args), max_tokens=AI_SECTION_MAX_TOKENS[section], section=section)
+    
+    def _generate_ai_text(self, prompt, max_tokens=500, section=None):
         """Generar texto usando OpenAI GPT con fallbacks mejorados"""
-        print(f"🤖 Generando texto con IA. Cliente disponible: {self.client is not None}")
+        prefetched = self._ai_texts.get(prompt)
+        if prefetched is not None:
+            return prefetched
+        
+        cache_key = self._ai_cache_key(prompt, max_tokens)
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            logger.debug("Texto recuperado de la cache de IA")
+            return cached_text
+        
+        logger.debug("Generando texto con IA. Cliente disponible: %s", self.client is not None)
         
         try:
             if not self.client:
-                print(f"⚠️ Cliente no disponible. Status: {self.openai_status}")
-                return self._generate_academic_fallback_text(prompt)
+                logger.warning("Cliente no disponible. Status: %s", self.openai_status)
+                return self._generate_academic_fallback_text(section)
             
-            print(f"📡 Enviando prompt a OpenAI (longitud: {len(prompt)})")
+            logger.debug("Enviando prompt a OpenAI (longitud: %d)", len(prompt))
             response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an expert academic writer specializing in systematic reviews."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._build_chat_messages(prompt),
                 max_tokens=max_tokens,
-                temperature=0.7
+                **self._model_params(max_tokens)
             )
             
             generated_text = response.choices[0].message.content.strip()
-            print(f"✅ Texto generado exitosamente (longitud: {len(generated_text)})")
+            cache.set(cache_key, generated_text, timeout=self.AI_CACHE_TIMEOUT)
+            logger.debug("Texto generado exitosamente (longitud: %d)", len(generated_text))
             return generated_text
             
         except Exception as e:
-            print(f"❌ Error en generación con IA: {e}")
-            return self._generate_academic_fallback_text(prompt)
+            logger.error("Error en generación con IA: %s", e)
+            self._check_auth_error(e)
+            return self._generate_academic_fallback_text(section)
     
-    def _generate_academic_fallback_text(self, prompt):
+    def _generate_academic_fallback_text(self, section):
         """Generar texto académico profesional como fallback"""
-        prompt_lower = prompt.lower()
-        
-        if "abstract" in prompt_lower:
-            return 
-        
-        elif "introduction" in prompt_lower:
-            return 
-        
-        elif "conclusion" in prompt_lower:
-            return 
-        
-        elif "rsq" in prompt_lower or "research question" in prompt_lower:
-            return 
+        return AI_FALLBACK_TEXTS.get(section, "")
     
     def _generate_title_and_abstract(self, sms_data):
         """Generar título y abstract del documento"""
-        story = []
         
         # Título principal
-        story.append(Paragraph(
+        yield Paragraph(
             f"{sms_data['titulo_estudio']}: A Systematic Mapping Study", 
             self.styles['CustomTitle']
-        ))
-        story.append(Spacer(1, 20))
+        )
+        yield Spacer(1, 20)
         
         # Autores
-        story.append(Paragraph(f"Authors: {sms_data['autores']}", self.styles['Normal']))
-        story.append(Spacer(1, 10))
+        yield Paragraph(f"Authors: {sms_data['autores']}", self.styles['Normal'])
+        yield Spacer(1, 10)
         
         # Abstract generado con IA
-        abstract = self._generate_ai_text(
+        abstract = self._generate_section_text('abstract', self._build_abstract_prompt, sms_data)
+        
+        yield Paragraph("Abstract", self.styles['CustomHeading2'])
+        yield Paragraph(abstract, self.styles['CustomNormal'])
+        
+        # Keywords
+        keywords = ', '.join(self._extract_keywords_from_title(sms_data['titulo_estudio']))
+        yield Paragraph(f"Keywords: {keywords}", self.styles['CustomNormal'])
+        yield Spacer(1, 30)
+    
+    def _build_abstract_prompt(self, sms_data):
+        """Prompt del abstract"""
+        return (
             f"Escribe un abstract para una revisión sistemática sobre {sms_data['titulo_estudio']} en ingles. "
             f"Incluya los objetivos de la investigación, la metodología y las principales conclusiones en estilo académico."
             f"solo dame el texto sin titulo ni listas "
         )
-        
-        story.append(Paragraph("Abstract", self.styles['CustomHeading2']))
-        story.append(Paragraph(abstract, self.styles['CustomNormal']))
-        
-        # Keywords
-        keywords = self._extract_keywords_from_title(sms_data['titulo_estudio'])
-        story.append(Paragraph(f"Keywords: {keywords}", self.styles['CustomNormal']))
-        story.append(Spacer(1, 30))
-        
-        return story
     
     def _generate_introduction(self, sms_data, articles_data):
         """Generar introducción completa para mapeo sistemático siguiendo estructura específica."""
-        story = []
-        story.append(Paragraph("INTRODUCCIÓN", self.styles['CustomHeading2']))
+        yield Paragraph("INTRODUCCIÓN", self.styles['CustomHeading2'])
+
+        # Generar toda la introducción de una vez
+        introduction_text = self._generate_section_text(
+            'introduction', self._build_introduction_prompt, sms_data, articles_data
+        )
+        yield Paragraph(introduction_text, self.styles['CustomNormal'])
 
+    def _build_introduction_prompt(self, sms_data, articles_data):
+        """Prompt unificado de la introducción"""
         # Extraer datos del sistema
-        total_articles = len(articles_data)
-        years = [a.get('anio_publicacion', 'Desconocido') for a in articles_data]
-        year_stats = {y: years.count(y) for y in set(years)}
-        top_years = sorted(year_stats.items(), key=lambda x: x[1], reverse=True)[:3]
+        article_stats = self._get_article_stats(articles_data)
+        total_articles = article_stats.total
+        top_years = article_stats.year_hist.most_common(3)
         
         # Obtener preguntas de investigación y subpreguntas del sms_data
         pregunta_principal = sms_data.get('pregunta_investigacion_1', '')
@@ -341,129 +1230,48 @@ class EnhancedReportGeneratorService:
         - El texto debe fluir naturalmente de un párrafo al siguiente
         - Usa los datos reales proporcionados para dar credibilidad al estudio
         """
-
-        # Generar toda la introducción de una vez
-        introduction_text = self._generate_ai_text(introduction_prompt, max_tokens=2500)
-        story.append(Paragraph(introduction_text, self.styles['CustomNormal']))
-
-        return story
+        return introduction_prompt
 
 
     
     def _generate_detailed_methodology(self, sms_data, articles_data, visualizations_data=None):
         """Generar sección de metodología detallada"""
-        story = []
+        titulo = sms_data['titulo_estudio']
+        
+        # Enumeración de keywords con números romanos (se usa en dos párrafos)
+        keywords_list = self._extract_keywords_from_title(titulo)
+        keywords_enum = ', '.join(f"{roman}) {kw}" for roman, kw in zip(ROMAN_NUMERALS, keywords_list))
         
-        story.append(Paragraph("1. MATERIALES Y MÉTODOS", self.styles['CustomHeading2']))
+        yield Paragraph("1. MATERIALES Y MÉTODOS", self.styles['CustomHeading2'])
         
         # Introducción a la metodología
-        story.append(Paragraph(
-            f"""
-            Este mapeo sistematico (SMS) se basa en las directrices 
-            propuestas en [1],[2], 
-            cuyo principal objetivo es analizar el estado actual de la 
-            investigación relacionada con las aplicaciones informáticas 
-            para {sms_data['titulo_estudio']}. Esta revisión consta de dos 
-            etapas: planificación y ejecución. 
-            La primera aborda la definición de las preguntas de investigación,
-            especificando la intervención de interés, 
-            el proceso de búsqueda y la definición de los criterios de selección
-            de artículos. La segunda etapa implementa 
-            el proceso de selección de las investigaciones relevantes para el objeto
-            de estudio, mediante 
-            la aplicación de los criterios de selección y la extracción de datos para
-            obtener los resultados de esta revisión sistemática.
-            """,
-            self.styles['CustomNormal']
-        ))
+        yield from self._methodology_paragraphs(('intro',), titulo=titulo)
         
         # Subsección A: Planificación
-        story.append(Paragraph("A. Planning", self.styles['Heading3']))
-        
-        story.append(Paragraph(
-            f"""
-            La intención de esta investigación se regirá por la pregunta 
-            principal de investigación (PRQ): 
-            {sms_data.get('pregunta_principal', 'Not defined')}""",
-            self.styles['CustomNormal']
-        ))
+        yield Paragraph("A. Planning", self.styles['Heading3'])
         
-        story.append(Paragraph(
-            f"""
-            La PRQ busca localizar documentos relevantes sobre el tema 
-            propuesto, para lograr este objetivo se divide en tres subpreguntas 
-            de investigación (RSQ). """,
-            self.styles['CustomNormal']
-        ))
+        # Los párrafos que dependen de un campo vacío no se generan
+        if prq := sms_data.get('pregunta_principal'):
+            yield from self._methodology_paragraphs(('prq',), pregunta_principal=prq)
+        yield from self._methodology_paragraphs(('rsq_intro',))
         
         # Sub-preguntas
         for i, key in enumerate(['subpregunta_1', 'subpregunta_2', 'subpregunta_3'], 1):
             if sms_data.get(key):
-                story.append(Paragraph(
+                yield Paragraph(
                     f"-RSQ_{i}: {sms_data[key]}", 
                     self.styles['CustomNormal']
-                ))
-        
-        story.append(Paragraph(
-            f"""
-            Para llevar a cabo la búsqueda de publicaciones científicas que contribuyan 
-            al análisis del objeto de estudio, se consideran tres bases
-            de datos de citas: Scopus, Web of Science (WoS) y PubMed. Las dos 
-            primeras son bases de datos bibliográficas de resúmenes y citas de 
-            artículos de revistas científicas. La tercera es un motor de búsqueda de 
-            referencias bibliográficas. Todas estas bases de 
-            datos se complementan entre sí, ya que incluyen documentos de 
-            diversas fuentes, incluyendo artículos de revistas y ponencias de 
-            congresos.""",
-            self.styles['CustomNormal']
-        ))
-
-        # Función para convertir números a números romanos
-        def to_roman(num):
-            values = [5, 4, 1]
-            symbols = ["V", "IV", "I"]
-            roman = ""
-            for i in range(len(values)):
-                count = num // values[i]
-                roman += symbols[i] * count
-                num -= values[i] * count
-            return roman
-
-        keywords = self._extract_keywords_from_title(sms_data['titulo_estudio'])
-        keywords_list = keywords.split(', ')
-
-        # Generar enumeración con números romanos
-        keywords_enum = ', '.join([f"{to_roman(i+1)}) {kw}" for i, kw in enumerate(keywords_list)])
-
-        story.append(Paragraph(
-            f"""
-            El proceso de revisión consiste en la elección de palabras clave, las 
-            cuales surgen de la pregunta de investigación: {keywords_enum}.""",
-            self.styles['CustomNormal']
-        ))
-        
-        story.append(Paragraph(
-            f"""
-            Las palabras clave permiten identificar sinónimos y términos 
-            relacionados con el objeto de estudio, que al combinarse forman 
-            la cadena de búsqueda, cuyo propósito es identificar artículos 
-            relevantes para la investigación. El período de búsqueda de 
-            publicaciones relevantes se realizó entre {sms_data.get('anio_inicio', 'N/A')} 
-            y {sms_data.get('anio_final', 'N/A')}, debido a la 
-            velocidad con la que se producen los cambios tecnológicos.""",
-            self.styles['CustomNormal']
-        ))
+                )
         
-        story.append(Paragraph(
-            f"""
-            Una vez encontrados los documentos, se aplicaron criterios de inclusión y 
-            exclusión para la preselección y selección de los artículos relevantes. Los 
-            principales criterios de una revisión sistemática son los siguientes:""",
-            self.styles['CustomNormal']
-        ))
+        yield from self._methodology_paragraphs(
+            ('databases', 'keywords', 'search_period', 'criteria_intro'),
+            keywords_enum=keywords_enum,
+            anio_inicio=sms_data.get('anio_inicio', 'N/A'),
+            anio_final=sms_data.get('anio_final', 'N/A')
+        )
         
         # Criterios de inclusión/exclusión
-        story.append(Paragraph("Criterios de inclusión:", self.styles['Heading5']))
+        yield Paragraph("Criterios de inclusión:", self.styles['Heading5'])
         inclusion = sms_data.get('criterios_inclusion')
         if inclusion:
             # Si es string, conviértelo a lista
@@ -471,115 +1279,35 @@ class EnhancedReportGeneratorService:
                 criterios_inclusion = [c.strip() for c in inclusion.split('\n') if c.strip()]
             else:
                 criterios_inclusion = inclusion
-            story.append(ListFlowable(
+            yield ListFlowable(
                 [ListItem(Paragraph(criterio, self.styles['CustomNormal'])) for criterio in criterios_inclusion],
                 bulletType='bullet'
-            ))
+            )
 
-        story.append(Paragraph("Criterios de exclusión:", self.styles['Heading5']))
+        yield Paragraph("Criterios de exclusión:", self.styles['Heading5'])
         exclusion = sms_data.get('criterios_exclusion')
         if exclusion:
             if isinstance(exclusion, str):
                 criterios_exclusion = [c.strip() for c in exclusion.split('\n') if c.strip()]
             else:
                 criterios_exclusion = exclusion
-            story.append(ListFlowable(
+            yield ListFlowable(
                 [ListItem(Paragraph(criterio, self.styles['CustomNormal'])) for criterio in criterios_exclusion],
                 bulletType='bullet'
-            ))
+            )
         
         # Subsección B: Ejecución
-        story.append(Paragraph("B. Execute", self.styles['Heading3']))
-        
-        story.append(Paragraph(
-            f"""
-            El proceso de ejecución comienza con la aplicación de la cadena de 
-            búsqueda inicial en bases de datos indexadas con el fin de refinar la cadena 
-            y encontrar los artículos relevantes al objeto de estudio.""",
-            self.styles['CustomNormal']
-        ))
+        yield Paragraph("B. Execute", self.styles['Heading3'])
         
-        story.append(Paragraph(
-            f"""
-            Durante la primera iteración de búsqueda en las bases de datos bibliográficas 
-            seleccionadas, el sistema obtuvo automáticamente el número de publicaciones 
-            encontradas en cada fuente, de acuerdo con los criterios y el periodo 
-            definidos por el usuario. Esta información inicial proporciona una visión 
-            general del volumen de literatura disponible y constituye el punto de partida 
-            para el proceso de selección y análisis de los artículos relevantes.""",
-            self.styles['CustomNormal']
-        ))
-        
-        story.append(Paragraph(
-            f"""
-            Después de una serie de pruebas y revisiones, se identificaron términos 
-            relacionados y sus sinónimos, de tal manera que: {keywords_enum}.""",
-            self.styles['CustomNormal']
-        ))
-        
-        story.append(Paragraph(
-            f"""
-            Por lo tanto, el modelo estándar de cadenas de búsqueda se expresa 
-            de la siguiente manera: {sms_data.get('cadena_busqueda', 'Not specified')}""",
-            self.styles['CustomNormal']
-        ))
-        
-        story.append(Paragraph(
-            f"""
-            Una vez aplicada la cadena de búsqueda refinada, 
-            el sistema identificó automáticamente los estudios 
-            primarios relevantes en cada base de datos seleccionada. 
-            Para maximizar la exhaustividad de la revisión, también 
-            se consideraron las referencias de los estudios encontrados, 
-            empleando la técnica de búsqueda en "bola de nieve" 
-            (Wohlin, 2014), con el objetivo de localizar artículos 
-            adicionales pertinentes al objeto de estudio.
-            """,
-            self.styles['CustomNormal']
-        ))
+        yield from self._methodology_paragraphs(('execute', 'first_iteration', 'synonyms'), keywords_enum=keywords_enum)
+        if cadena := sms_data.get('cadena_busqueda'):
+            yield from self._methodology_paragraphs(('search_string',), cadena_busqueda=cadena)
+        yield from self._methodology_paragraphs(('snowball',))
         
         # Obtener datos PRISMA
-        analyzer = SemanticResearchAnalyzer()
-        real_data = analyzer._extract_real_prisma_data(articles_data, sms_data)
-        
-        story.append(Paragraph(
-            f"""
-            Tal como se ilustra en la Figura 1, el sistema documenta detalladamente 
-            el proceso de selección de artículos. Inicialmente, se identificaron 
-            {real_data['initial_search']} estudios potencialmente relevantes a través 
-            de las bases de datos seleccionadas, y se identificaron {real_data['additional_sources']}  
-            estudios adicionales a través de otras fuentes.  Después de eliminar {real_data['duplicates_removed']} 
-            artículo duplicado, quedaron {real_data['after_duplicates']} artículos para la revisión de título 
-            y resumen. De estos, {real_data['title_abstract_excluded']} fueron 
-            excluidos basándose en los criterios de inclusión y exclusión. 
-            Los {real_data['full_text_assessed']} artículos restantes fueron evaluados a texto completo, 
-            de los cuales {real_data['full_text_excluded']} fueron excluidos. Finalmente, {real_data['final_included']} estudios cumplieron 
-            con todos los criterios y fueron incluidos en la síntesis cuantitativa, 
-            representando una tasa de selección del {real_data['selection_rate']}%.
-            """,
-            self.styles['CustomNormal']
-        ))
+        real_data = self._get_prisma_data(articles_data, sms_data)
         
-        story.append(Paragraph(
-            f"""
-            Finalmente, se obtuvieron {real_data['final_included']} artículos para ser analizados en detalle. 
-            Una primera aproximación de los estudios relevantes es su pre-selección; 
-            primero, se descartaron los artículos cuyo idioma era diferente del inglés, 
-            y luego se analizaron el título, el resumen y las palabras clave de cada artículo
-            para verificar si están relacionados con el objeto de estudio. Después de esta 
-            evaluación, se eliminaron {real_data['full_text_excluded']} artículos y se obtuvieron {real_data['final_included']} artículos para su 
-            revisión completa. Para la selección de artículos, se analizó a fondo el texto 
-            completo para determinar si el artículo estaba estrechamente relacionado con 
-            el objeto de estudio, o si se desarrolló una aplicación que pudiera verificar 
-            la construcción de una herramienta como requisito mínimo para la selección. 
-            Para evitar la subjetividad, las actividades de revisión de artículos y 
-            extracción de datos se realizaron de manera independiente. 
-            Si un artículo no fue incluido, se mencionó el motivo de su exclusión. 
-            Con este análisis, se eliminaron {real_data['full_text_excluded']} 
-            artículos, resultando en {real_data['final_included']} estudios 
-            utilizados para la extracción de datos.""",
-            self.styles['CustomNormal']
-        ))
+        yield from self._methodology_paragraphs(('prisma', 'selection'), **real_data)
         
         if visualizations_data and 'prisma_diagram' in visualizations_data:
             
@@ -588,40 +1316,57 @@ class EnhancedReportGeneratorService:
                 visualizations_data['prisma_diagram']['image_base64']
             )
             if prisma_image:
-                story.append(prisma_image)
-                story.append(Spacer(1, 10))
-                story.append(Paragraph(
+                yield prisma_image
+                yield Spacer(1, 10)
+                yield Paragraph(
                     "Figura 1. Diagrama de flujo que muestra una visión general del proceso "
                     "de investigación para estudios relevantes.", 
                     self.styles['CustomNormal']
-                ))
-
-        return story
+                )
+    
+    def _methodology_paragraphs(self, names, **values):
+        """Párrafos de METHODOLOGY_TEMPLATES rellenados con los datos del estudio"""
+        style = self.styles['CustomNormal']
+        for name in names:
+            yield Paragraph(METHODOLOGY_TEMPLATES[name].format(**values), style)
+    
+    def _get_prisma_data(self, articles_data, sms_data):
+        """Datos PRISMA memoizados por los campos de los artículos que usa el análisis"""
+        key = tuple(tuple(a.get(field) for field in PRISMA_KEY_FIELDS) for a in articles_data)
+        with _prisma_cache_lock:
+            real_data = _prisma_cache.get(key)
+        if real_data is None:
+            real_data = get_semantic_analyzer()._extract_real_prisma_data(articles_data, sms_data)
+            with _prisma_cache_lock:
+                if key not in _prisma_cache and len(_prisma_cache) >= PRISMA_CACHE_SIZE:
+                    _prisma_cache.pop(next(iter(_prisma_cache)))  # Descartar la entrada más antigua
+                _prisma_cache[key] = real_data
+        # Solo se reutilizan los conteos; la fecha del análisis es la de este reporte
+        return dict(real_data, analysis_date=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
     
     def _generate_comprehensive_results_section(self, sms_data, articles_data, visualizations_data=None):
         """
         Genera la sección C. Results con estructura académica completa usando ChatGPT.
         """
-        story = []
-        print("📊 Generando sección C. Results con IA...")
+        logger.debug("Generando sección C. Results con IA...")
         
         # Título de la sección
-        story.append(Paragraph("C. Results", self.styles['Heading3']))
+        yield Paragraph("C. Results", self.styles['Heading3'])
         
         # Obtener estadísticas reales para el análisis
         stats = self._extract_detailed_statistics(articles_data)
-        print(f"📈 Estadísticas extraídas: {stats['selected_count']} seleccionados de {stats['total_articles']}")
+        logger.debug("Estadísticas extraídas: %s seleccionados de %s", stats['selected_count'], stats['total_articles'])
         
         # Paso 1: Párrafo Introductorio
         intro_paragraph = self._generate_results_introduction(sms_data, stats, visualizations_data)
-        story.append(Paragraph(intro_paragraph, self.styles['CustomNormal']))
-        story.append(Spacer(1, 15))
+        yield Paragraph(intro_paragraph, self.styles['CustomNormal'])
+        yield Spacer(1, 15)
         
         # Paso 2: Respuestas Sistemáticas a las Preguntas de Investigación
         for i in range(1, 4):
             subquestion_key = f'subpregunta_{i}'
             if sms_data.get(subquestion_key):
-                print(f"🔍 Generando análisis para RSQ_{i}")
+                logger.debug("Generando análisis para RSQ_%s", i)
                 rsq_section = self._generate_rsq_analysis(
                     question_number=i,
                     question_text=sms_data[subquestion_key],
@@ -629,41 +1374,51 @@ class EnhancedReportGeneratorService:
                     statistics=stats,
                     visualizations_data=visualizations_data
                 )
-                story.extend(rsq_section)
-        
-        return story
+                yield from rsq_section
 
     def _extract_detailed_statistics(self, articles_data):
+        """Estadísticas detalladas, calculadas una sola vez por reporte (las usan tres secciones)"""
+        if self._detailed_stats is not None and self._stats_source is articles_data:
+            return self._detailed_stats
+        stats = self._compute_detailed_statistics(articles_data)
+        if self._stats_source is articles_data:
+            self._detailed_stats = stats
+        return stats
+    
+    def _compute_detailed_statistics(self, articles_data):
         """Extrae estadísticas detalladas de los artículos para el análisis."""
         
         # Estadísticas básicas
         total_articles = len(articles_data)
-        selected_articles = [a for a in articles_data if a.get('estado') == 'SELECTED']
+        selected_articles = self._get_article_stats(articles_data).selected
         selected_count = len(selected_articles)
         
-        # Análisis por año
-        years = [a.get('anio_publicacion') for a in selected_articles if a.get('anio_publicacion')]
-        year_distribution = Counter(years)
-        
-        # Análisis por revista/journal
-        journals = [a.get('journal', 'Sin revista') for a in selected_articles 
-                    if a.get('journal') and a.get('journal') != 'Sin revista']
-        journal_distribution = Counter(journals)
-        
-        # Análisis de respuestas a subpreguntas
-        subq1_responses = [a.get('respuesta_subpregunta_1', '') for a in selected_articles 
-                           if a.get('respuesta_subpregunta_1') and a.get('respuesta_subpregunta_1') != 'Sin respuesta disponible']
-        subq2_responses = [a.get('respuesta_subpregunta_2', '') for a in selected_articles 
-                           if a.get('respuesta_subpregunta_2') and a.get('respuesta_subpregunta_2') != 'Sin respuesta disponible']
-        subq3_responses = [a.get('respuesta_subpregunta_3', '') for a in selected_articles 
-                           if a.get('respuesta_subpregunta_3') and a.get('respuesta_subpregunta_3') != 'Sin respuesta disponible']
-        
-        print(f"📋 Respuestas encontradas: RSQ1={len(subq1_responses)}, RSQ2={len(subq2_responses)}, RSQ3={len(subq3_responses)}")
-        
-        # Análisis por enfoque (si existe)
-        enfoques = [a.get('enfoque', 'No especificado') for a in selected_articles 
-                    if a.get('enfoque')]
-        enfoque_distribution = Counter(enfoques)
+        # Una sola pasada sobre los seleccionados para años, revistas, enfoques y respuestas
+        year_distribution = Counter()
+        journal_distribution = Counter()
+        enfoque_distribution = Counter()
+        subq1_responses, subq2_responses, subq3_responses = [], [], []
+        response_lists = (('respuesta_subpregunta_1', subq1_responses),
+                          ('respuesta_subpregunta_2', subq2_responses),
+                          ('respuesta_subpregunta_3', subq3_responses))
+        for a in selected_articles:
+            get = a.get  # Un solo acceso al método por artículo
+            year = get('anio_publicacion')
+            if year:
+                year_distribution[year] += 1
+            journal = get('journal')
+            if journal and journal != 'Sin revista':
+                journal_distribution[journal] += 1
+            enfoque = get('enfoque')
+            if enfoque:
+                enfoque_distribution[enfoque] += 1
+            for key, responses in response_lists:
+                response = get(key)
+                if response and response != 'Sin respuesta disponible':
+                    responses.append(response)
+        years = year_distribution.keys()
+        
+        logger.debug("Respuestas encontradas: RSQ1=%s, RSQ2=%s, RSQ3=%s", len(subq1_responses), len(subq2_responses), len(subq3_responses))
         
         return {
             'total_articles': total_articles,
@@ -684,6 +1439,10 @@ class EnhancedReportGeneratorService:
 
     def _generate_results_introduction(self, sms_data, stats, visualizations_data):
         """Genera párrafo introductorio para la sección de resultados usando ChatGPT."""
+        return self._generate_section_text('results', self._build_results_introduction_prompt, sms_data, stats)
+
+    def _build_results_introduction_prompt(self, sms_data, stats):
+        """Prompt del párrafo introductorio de resultados"""
         prompt = f"""
         Escribe un párrafo introductorio académico profesional para la sección de resultados 
         de un mapeo sistemático sobre "{sms_data['titulo_estudio']}".
@@ -708,23 +1467,45 @@ class EnhancedReportGeneratorService:
         Responde SOLO con el párrafo, sin texto adicional.
         """
         
-        return self._generate_ai_text(prompt)
+        return prompt
 
     def _generate_rsq_analysis(self, question_number, question_text, articles_data, statistics, visualizations_data):
         """Genera análisis detallado para una pregunta de investigación específica usando ChatGPT."""
-        story = []
         
         # Título de la RSQ
-        story.append(Paragraph(f"RSQ_{question_number}: {question_text}", self.styles['Heading3']))
+        yield Paragraph(f"RSQ_{question_number}: {question_text}", self.styles['Heading3'])
         
+        logger.debug("Analizando RSQ_%s con %s respuestas", question_number, len(statistics.get(f'subq{question_number}_responses', [])))
+        
+        # Generar análisis con ChatGPT
+        analysis_text = self._generate_section_text(
+            'rsq', self._build_rsq_analysis_prompt, question_number, question_text, statistics
+        )
+        
+        # Dividir en párrafos y añadir al story
+        paragraphs = analysis_text.split('\n\n')
+        for paragraph in paragraphs:
+            if paragraph.strip():
+                # Limpiar marcadores de markdown si existen
+                clean_paragraph = paragraph.replace('*', '').strip()  # Quitar '*' también elimina los '**'
+                yield Paragraph(clean_paragraph, self.styles['CustomNormal'])
+                yield Spacer(1, 8)
+
+    def _build_rsq_analysis_prompt(self, question_number, question_text, statistics):
+        """Prompt del análisis de una pregunta de investigación"""
         # Obtener respuestas específicas para esta pregunta
         subq_key = f'subq{question_number}_responses'
         responses = statistics.get(subq_key, [])
         
-        print(f"🔍 Analizando RSQ_{question_number} con {len(responses)} respuestas")
-        
-        # Analizar respuestas para extraer patrones
-        analysis_data = self._analyze_subquestion_responses(responses, question_number)
+        # Analizar respuestas para extraer patrones (una vez por pregunta y reporte)
+        if statistics is self._detailed_stats:
+            analysis_data = self._subquestion_analyses.get(question_number)
+            if analysis_data is None:
+                analysis_data = self._subquestion_analyses[question_number] = (
+                    self._analyze_subquestion_responses(responses, question_number)
+                )
+        else:
+            analysis_data = self._analyze_subquestion_responses(responses, question_number)
         
         # Generar análisis con ChatGPT
         analysis_prompt = f"""
@@ -757,18 +1538,7 @@ class EnhancedReportGeneratorService:
         solo dame el texto sin titulo ni listas 
         """
         
-        analysis_text = self._generate_ai_text(analysis_prompt, max_tokens=800)
-        
-        # Dividir en párrafos y añadir al story
-        paragraphs = analysis_text.split('\n\n')
-        for paragraph in paragraphs:
-            if paragraph.strip():
-                # Limpiar marcadores de markdown si existen
-                clean_paragraph = paragraph.replace('**', '').replace('*', '').strip()
-                story.append(Paragraph(clean_paragraph, self.styles['CustomNormal']))
-                story.append(Spacer(1, 8))
-        
-        return story
+        return analysis_prompt
 
     def _analyze_subquestion_responses(self, responses, question_number):
         """Analiza las respuestas a una subpregunta específica para extraer patrones."""
@@ -780,30 +1550,17 @@ class EnhancedReportGeneratorService:
                 'keywords': []
             }
         
-        # Combinar todas las respuestas para análisis
-        combined_text = ' '.join(responses).lower()
-        
-        # Extraer palabras clave frecuentes (excluyendo stopwords)
-        stop_words = {'el', 'la', 'de', 'que', 'y', 'a', 'en', 'un', 'es', 'se', 'no', 'te', 'lo', 'le', 'da', 'su', 'por', 'son', 'con', 'para', 'al', 'del', 'los', 'las', 'una', 'su', 'este', 'esta', 'como', 'más', 'pero', 'sus', 'muy', 'sin', 'sobre', 'entre', 'ser', 'estar', 'hacer', 'the', 'of', 'and', 'to', 'in', 'is', 'it', 'you', 'that', 'he', 'was', 'for', 'on', 'are', 'as', 'with', 'his', 'they', 'i', 'at', 'be', 'this', 'have', 'from', 'or', 'one', 'had', 'by', 'word', 'but', 'not', 'what', 'all', 'were', 'we', 'when', 'your', 'can', 'said', 'there', 'each', 'which', 'she', 'do', 'how', 'their', 'if', 'will', 'up', 'other', 'about', 'out', 'many', 'then', 'them', 'these', 'so', 'some', 'her', 'would', 'make', 'like', 'into', 'him', 'has', 'two', 'more', 'much', 'my', 'way', 'been', 'who', 'its', 'now', 'find', 'long', 'down', 'day', 'did', 'get', 'come', 'made', 'may', 'part'}
-        
-        # Extraer palabras significativas
-        words = re.findall(r'\b[a-zA-ZáéíóúñüÁÉÍÓÚÑÜ]{3,}\b', combined_text)
-        filtered_words = [word for word in words if word not in stop_words]
-        word_freq = Counter(filtered_words)
+        # Extraer palabras significativas respuesta por respuesta (sin unir todo el texto en una copia)
+        # Counter cuenta en C y luego se quitan las stopwords (una operación por palabra distinta)
+        word_freq = Counter(chain.from_iterable(RESPONSE_WORD_RE.findall(response.lower()) for response in responses))
+        for word in RESPONSE_STOP_WORDS.intersection(word_freq):
+            del word_freq[word]
         
         # Categorización básica según el número de pregunta
-        if question_number == 1:
-            # Pregunta 1: Usualmente sobre métodos/enfoques
-            tech_keywords = ['machine', 'learning', 'algorithm', 'statistical', 'analysis', 'model', 'approach', 'method', 'technique', 'algoritmo', 'análisis', 'método', 'técnica', 'estadístico']
-            categories = self._categorize_by_keywords(responses, tech_keywords, 'Técnicas y Métodos')
-        elif question_number == 2:
-            # Pregunta 2: Usualmente sobre aplicaciones/dominios
-            app_keywords = ['health', 'medical', 'clinical', 'diagnostic', 'treatment', 'patient', 'disease', 'salud', 'médico', 'clínico', 'diagnóstico', 'tratamiento', 'paciente', 'enfermedad']
-            categories = self._categorize_by_keywords(responses, app_keywords, 'Aplicaciones Médicas')
-        else:
-            # Pregunta 3: Usualmente sobre limitaciones/futuro
-            limit_keywords = ['limitation', 'challenge', 'future', 'recommendation', 'improvement', 'limitación', 'desafío', 'futuro', 'recomendación', 'mejora']
-            categories = self._categorize_by_keywords(responses, limit_keywords, 'Limitaciones y Futuro')
+        if question_number not in SUBQUESTION_CATEGORIES:
+            question_number = 3
+        category = SUBQUESTION_CATEGORIES[question_number][1]
+        categories = self._categorize_by_keywords(responses, SUBQUESTION_KEYWORDS_RE[question_number], category)
         
         return {
             'patterns': list(word_freq.most_common(5)),
@@ -812,15 +1569,14 @@ class EnhancedReportGeneratorService:
             'keywords': list(word_freq.most_common(10))
         }
 
-    def _categorize_by_keywords(self, responses, keywords, default_category):
-        """Categoriza respuestas basándose en palabras clave."""
+    def _categorize_by_keywords(self, responses, keywords_re, default_category):
+        """Categoriza respuestas basándose en palabras clave (una regex con todas ellas)."""
         categories = {default_category: []}
         other_category = 'Otros aspectos'
         categories[other_category] = []
         
         for response in responses:
-            response_lower = response.lower()
-            if any(keyword in response_lower for keyword in keywords):
+            if keywords_re.search(response):  # Una sola búsqueda en lugar de una por palabra clave
                 categories[default_category].append(response)
             else:
                 categories[other_category].append(response)
@@ -830,7 +1586,6 @@ class EnhancedReportGeneratorService:
     
     def _integrate_visualizations(self, visualizations_data, sms_data):
         """Integrar las visualizaciones existentes del sistema en el reporte"""
-        story = []
                 
         # Integrar análisis semántico
         if 'semantic_analysis' in visualizations_data:
@@ -838,8 +1593,8 @@ class EnhancedReportGeneratorService:
                 visualizations_data['semantic_analysis']['image_base64']
             )
             if semantic_image:
-                story.append(semantic_image)
-                story.append(Paragraph("Figure 2: Semantic Analysis Distribution", self.styles['Normal']))
+                yield semantic_image
+                yield Paragraph("Figure 2: Semantic Analysis Distribution", self.styles['Normal'])
         
         # Integrar gráfico de burbujas
         if 'bubble_chart' in visualizations_data:            
@@ -847,26 +1602,23 @@ class EnhancedReportGeneratorService:
                 visualizations_data['bubble_chart']['image_base64']
             )
             if bubble_image:
-                story.append(bubble_image)
-                story.append(Paragraph("Figure 3: Techniques vs Applications Bubble Chart", self.styles['Normal']))
+                yield bubble_image
+                yield Paragraph("Figure 3: Techniques vs Applications Bubble Chart", self.styles['Normal'])
 
-        
-        return story
     
     def _generate_information_extraction_table(self, articles_data):
         """Generar UNA tabla unificada de extracción de información para todos los artículos"""
-        story = []
         
         # Título de la sección
-        story.append(Paragraph("D. INFORMATION EXTRACTION", self.styles['CustomHeading2']))
-        story.append(Spacer(1, 10))
+        yield Paragraph("D. INFORMATION EXTRACTION", self.styles['CustomHeading2'])
+        yield Spacer(1, 10)
         
         # Filtrar solo artículos seleccionados
-        selected_articles = [a for a in articles_data if a.get('estado') == 'SELECTED']
+        selected_articles = self._get_article_stats(articles_data).selected
         
         if not selected_articles:
-            story.append(Paragraph("No selected articles found for extraction.", self.styles['CustomNormal']))
-            return story
+            yield Paragraph("No selected articles found for extraction.", self.styles['CustomNormal'])
+            return
         
         # Crear datos para UNA SOLA tabla con todos los artículos
         table_data = []
@@ -878,194 +1630,75 @@ class EnhancedReportGeneratorService:
             ""
         ])
         
-        # Agregar datos de cada artículo consecutivamente
-        for idx, article in enumerate(selected_articles, 1):
-            
-            # Calcular cuántas filas ocupará este artículo (7 filas por artículo)
-            rows_for_article = 7
-            start_row = len(table_data)  # Fila donde empieza este artículo
-            
-            # Fila 1 del artículo: Título
-            titulo = article.get('titulo', 'N/A')
-            table_data.append([
-                Paragraph(f"{idx}", self.styles['CustomHeading5']),  # ID del artículo
-                Paragraph("Titulo", self.styles['CustomHeading5']), 
-                Paragraph(titulo, self.styles['CustomNormal'])
-            ])
-            
-            # Fila 2 del artículo: Autor
-            autor = article.get('autores', 'N/A')
-            table_data.append([
-                "",  # Celda vacía para mantener estructura
-                Paragraph("Autor", self.styles['CustomHeading5']), 
-                Paragraph(autor, self.styles['CustomNormal'])
-            ])
-            
-            # Fila 3 del artículo: Publicación
-            publicacion = article.get('journal', 'N/A')
-            table_data.append([
-                "",  # Celda vacía para mantener estructura
-                Paragraph("Publicacion", self.styles['CustomHeading5']), 
-                Paragraph(publicacion, self.styles['CustomNormal'])
-            ])
-            
-            # Fila 4 del artículo: Año
-            año = str(article.get('anio_publicacion', 'N/A'))
-            table_data.append([
-                "",  # Celda vacía para mantener estructura
-                Paragraph("Año", self.styles['CustomHeading5']), 
-                Paragraph(año, self.styles['CustomNormal'])
-            ])
-            
-            # Fila 5 del artículo: sub_pregunta1
-            subq1 = article.get('respuesta_subpregunta_1', 'Sin respuesta')
-            table_data.append([
-                "",  # Celda vacía para mantener estructura
-                Paragraph("Tipo de técnica:", self.styles['CustomHeading5']), 
-                Paragraph(subq1, self.styles['CustomNormal'])
-            ])
-            
-            # Fila 6 del artículo: sub_pregunta2
-            subq2 = article.get('respuesta_subpregunta_2', 'Sin respuesta')
-            table_data.append([
-                "",  # Celda vacía para mantener estructura
-                Paragraph("Tipo de registro:", self.styles['CustomHeading5']), 
-                Paragraph(subq2, self.styles['CustomNormal'])
-            ])
-            
-            # Fila 7 del artículo: sub_pregunta3
-            subq3 = article.get('respuesta_subpregunta_3', 'Sin respuesta')
-            table_data.append([
-                "",  # Celda vacía para mantener estructura
-                Paragraph("Tipo de limitaciones:", self.styles['CustomHeading5']), 
-                Paragraph(subq3, self.styles['CustomNormal'])
-            ])
-        
-        # Configurar anchos de columna (3 columnas)
-        col_widths = [
-            0.5*inch,  # Primera columna para ID
-            1.3*inch,  # Segunda columna para nombres de campos
-            5.2*inch   # Tercera columna para datos del artículo
-        ]
-        
-        # Crear UNA SOLA tabla con todos los artículos
-        table = Table(table_data, colWidths=col_widths, repeatRows=1)
-        
-        # Construir los estilos dinámicamente
-        table_styles = [
-            # Estilo para el encabezado principal (primera fila, combina las 3 columnas)
-            ('SPAN', (0, 0), (2, 0)),  # Combinar las 3 columnas de la primera fila
-            ('BACKGROUND', (0, 0), (2, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (2, 0), colors.black),
-            ('ALIGN', (0, 0), (2, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (2, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (2, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (2, 0), 8),
-            ('TOPPADDING', (0, 0), (2, 0), 8),
-            
-            # Estilo para la segunda columna (nombres de campos)
-            ('BACKGROUND', (1, 1), (1, -1), colors.lightgrey),
-            ('TEXTCOLOR', (1, 1), (1, -1), colors.black),
-            ('ALIGN', (1, 1), (1, -1), 'LEFT'),
-            ('VALIGN', (1, 1), (1, -1), 'TOP'),
-            
-            # Estilo para la tercera columna (datos del artículo)
-            ('BACKGROUND', (2, 1), (2, -1), colors.white),
-            ('TEXTCOLOR', (2, 1), (2, -1), colors.black),
-            ('ALIGN', (2, 1), (2, -1), 'LEFT'),
-            ('VALIGN', (2, 1), (2, -1), 'TOP'),
-            
-            # Bordes para toda la tabla
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('LINEBELOW', (0, 0), (-1, 0), 2, colors.black),  # Línea más gruesa bajo encabezado
-            ('LINEAFTER', (0, 1), (0, -1), 2, colors.black),  # Línea más gruesa después de columna ID
-            ('LINEAFTER', (1, 1), (1, -1), 2, colors.black),  # Línea más gruesa después de nombres de campos
-            
-            # Padding optimizado
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 1), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+        # Las etiquetas son iguales para todos los artículos: un Paragraph por campo, compartido por todas las filas
+        fields = [
+            (Paragraph(label, self.styles['CustomHeading5']), key, default)
+            for label, key, default in EXTRACTION_TABLE_FIELDS
         ]
         
-        # Agregar estilos para cada artículo (combinar celdas de ID)
-        current_row = 1  # Empezamos después del encabezado
+        # Agregar datos de cada artículo consecutivamente (una fila por campo)
         for idx, article in enumerate(selected_articles, 1):
-            # Combinar las 7 filas de la columna ID para este artículo
-            end_row = current_row + 6  # 7 filas por artículo (0-6 = 7 filas)
-            
-            # Span para la columna ID de este artículo
-            table_styles.append(('SPAN', (0, current_row), (0, end_row)))
-            
-            # Estilo para la celda ID de este artículo
-            table_styles.extend([
-                ('BACKGROUND', (0, current_row), (0, end_row), colors.white),
-                ('TEXTCOLOR', (0, current_row), (0, end_row), colors.black),
-                ('ALIGN', (0, current_row), (0, end_row), 'CENTER'),
-                ('VALIGN', (0, current_row), (0, end_row), 'MIDDLE'),
-                ('FONTNAME', (0, current_row), (0, end_row), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, current_row), (0, end_row), 14),
-            ])
-            
-            # Avanzar al siguiente artículo
-            current_row += 7
+            for row, (label, key, default) in enumerate(fields):
+                table_data.append([
+                    Paragraph(f"{idx}", self.styles['CustomHeading5']) if row == 0 else "",  # ID del artículo
+                    label,
+                    Paragraph(str(article.get(key, default)), self.styles['CustomNormal'])
+                ])
+        
+        # Crear UNA SOLA tabla con todos los artículos
+        # LongTable reparte el trabajo de medir filas al paginar, la tabla crece 7 filas por artículo
+        table = LongTable(table_data, colWidths=EXTRACTION_TABLE_COL_WIDTHS, repeatRows=1)
         
-        # Aplicar todos los estilos
-        table.setStyle(TableStyle(table_styles))
+        # Estilos fijos más un SPAN por artículo para combinar sus filas en la columna ID
+        rows_per_article = len(fields)
+        table.setStyle(TableStyle(EXTRACTION_TABLE_STYLE + [
+            ('SPAN', (0, start_row), (0, start_row + rows_per_article - 1))
+            for start_row in range(1, len(table_data), rows_per_article)
+        ]))
         
         # Añadir la tabla al documento
-        story.append(Spacer(1, 6))
-        story.append(table)
+        yield Spacer(1, 6)
+        yield table
         
-        return story
     def _generate_analysis_and_discussions_section(self, sms_data, articles_data, visualizations_data=None):
         """
         Genera el apartado '3. Analysis and discussions' usando ChatGPT
         Coloca esta función después de _generate_information_extraction_table
         """
-        story = []
-        print("🔍 Generando apartado 'Analysis and discussions' con IA...")
+        logger.debug("Generando apartado 'Analysis and discussions' con IA...")
         
         # PASO 1: Extraer estadísticas detalladas (ya existe en tu código)
         stats = self._extract_detailed_statistics(articles_data)
         
-        # PASO 2: Crear análisis de patrones por pregunta
-        analysis_patterns = self._extract_rsq_patterns_analysis(articles_data, stats)
-        
-        # PASO 3: Construir el prompt completo para ChatGPT
-        prompt = self._build_analysis_discussions_prompt(sms_data, stats, analysis_patterns)
-        
+        # PASO 2 y 3: Patrones por pregunta y prompt completo (solo si hay cliente de OpenAI)
         # PASO 4: Generar texto con ChatGPT
-        analysis_text = self._generate_ai_text(prompt, max_tokens=2500)
+        analysis_text = self._generate_section_text(
+            'analysis', self._build_analysis_discussions_section_prompt, sms_data, articles_data, stats
+        )
         
         # PASO 5: Procesar y estructurar la respuesta
-        story.extend(self._process_analysis_discussions_response(analysis_text))
-        
-        return story
+        yield from self._process_analysis_discussions_response(analysis_text)
+
+    def _build_analysis_discussions_section_prompt(self, sms_data, articles_data, stats):
+        """Prompt de 'Analysis and discussions' a partir de los patrones de cada RSQ"""
+        analysis_patterns = self._extract_rsq_patterns_analysis(articles_data, stats)
+        return self._build_analysis_discussions_prompt(sms_data, stats, analysis_patterns)
 
     def _extract_rsq_patterns_analysis(self, articles_data, stats):
         """
         NUEVO: Extrae patrones específicos para cada RSQ
         """
-        selected_articles = [a for a in articles_data if a.get('estado') == 'SELECTED']
-        
-        patterns = {}
-        
-        # Analizar RSQ1 (métodos/técnicas)
-        rsq1_responses = [a.get('respuesta_subpregunta_1', '') for a in selected_articles 
-                        if a.get('respuesta_subpregunta_1') and a.get('respuesta_subpregunta_1') != 'Sin respuesta disponible']
-        patterns['rsq1'] = self._analyze_text_patterns(rsq1_responses, 'techniques')
-        
-        # Analizar RSQ2 (aplicaciones/dominios)
-        rsq2_responses = [a.get('respuesta_subpregunta_2', '') for a in selected_articles 
-                        if a.get('respuesta_subpregunta_2') and a.get('respuesta_subpregunta_2') != 'Sin respuesta disponible']
-        patterns['rsq2'] = self._analyze_text_patterns(rsq2_responses, 'applications')
-        
-        # Analizar RSQ3 (limitaciones/futuro)
-        rsq3_responses = [a.get('respuesta_subpregunta_3', '') for a in selected_articles 
-                        if a.get('respuesta_subpregunta_3') and a.get('respuesta_subpregunta_3') != 'Sin respuesta disponible']
-        patterns['rsq3'] = self._analyze_text_patterns(rsq3_responses, 'limitations')
-        
+        # La precarga y la sección construyen el mismo prompt: los patrones se calculan una vez por reporte
+        if self._rsq_patterns is not None and stats is self._detailed_stats:
+            return self._rsq_patterns
+        # Las respuestas ya vienen filtradas de la pasada única de _compute_detailed_statistics
+        patterns = {
+            'rsq1': self._analyze_text_patterns(stats['subq1_responses'], 'techniques'),  # métodos/técnicas
+            'rsq2': self._analyze_text_patterns(stats['subq2_responses'], 'applications'),  # aplicaciones/dominios
+            'rsq3': self._analyze_text_patterns(stats['subq3_responses'], 'limitations'),  # limitaciones/futuro
+        }
+        if stats is self._detailed_stats:
+            self._rsq_patterns = patterns
         return patterns
 
     def _analyze_text_patterns(self, responses, category_type):
@@ -1075,30 +1708,18 @@ class EnhancedReportGeneratorService:
         if not responses:
             return {"keywords": [], "categories": {}, "summary": "Sin datos suficientes", "total_responses": 0}
         
-        # Combinar todas las respuestas
-        combined_text = ' '.join(responses).lower()
-        
-        # Definir palabras clave por categoría
-        if category_type == 'techniques':
-            key_terms = ['machine learning', 'deep learning', 'algorithm', 'statistical', 'neural network', 
-                        'regression', 'classification', 'clustering', 'ai', 'artificial intelligence',
-                        'aprendizaje automático', 'algoritmo', 'estadístico', 'inteligencia artificial']
-        elif category_type == 'applications':
-            key_terms = ['healthcare', 'medical', 'clinical', 'diagnostic', 'treatment', 'patient',
-                        'disease', 'health', 'salud', 'médico', 'clínico', 'diagnóstico', 'tratamiento']
-        else:  # limitations
-            key_terms = ['limitation', 'challenge', 'problem', 'issue', 'future work', 'improvement',
-                        'limitación', 'desafío', 'problema', 'trabajo futuro', 'mejora']
-        
-        # Contar menciones
-        keyword_counts = {}
-        for term in key_terms:
-            count = combined_text.count(term)
-            if count > 0:
-                keyword_counts[term] = count
+        # Palabras clave de la categoría (limitations por defecto)
+        if category_type not in PATTERN_KEY_TERMS:
+            category_type = 'limitations'
+        
+        # Contar menciones de todos los términos en una sola pasada por respuesta
+        # (la regex ignora mayúsculas, no hace falta unir ni pasar a minúsculas las respuestas)
+        terms_re = PATTERN_KEY_TERMS_RE[category_type]
+        matches = Counter(m.group(0).lower() for response in responses for m in terms_re.finditer(response))
+        keyword_counts = {term: matches[term] for term in PATTERN_KEY_TERMS[category_type] if matches[term]}
         
         # Crear resumen
-        top_keywords = sorted(keyword_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+        top_keywords = heapq.nlargest(5, keyword_counts.items(), key=BY_COUNT)  # Mismo orden que sorted(...)[:5]
         
         return {
             "keywords": top_keywords,
@@ -1130,7 +1751,7 @@ class EnhancedReportGeneratorService:
     2. Resultados cuantitativos principales:
     - Distribución temporal: {stats['year_distribution']}
     - Año más productivo: {stats['most_productive_year'][0]} con {stats['most_productive_year'][1]} artículos
-    - Distribución por revista (top 5): {dict(list(stats['journal_distribution'].items())[:5])}
+    - Distribución por revista (top 5): {dict(islice(stats['journal_distribution'].items(), 5))}
     - Distribución por enfoque: {stats['enfoque_distribution']}
 
     3. Análisis de respuestas por pregunta:
@@ -1190,12 +1811,9 @@ class EnhancedReportGeneratorService:
         NUEVO: Procesa la respuesta de ChatGPT y la convierte en elementos ReportLab
         Mantiene el texto como flujo continuo sin dividir en subsecciones
         """
-        import re
-        story = []
-        
         # Agregar título de la sección
-        story.append(Paragraph("3. Analysis and discussions", self.styles['CustomHeading2']))
-        story.append(Spacer(1, 15))
+        yield Paragraph("3. Analysis and discussions", self.styles['CustomHeading2'])
+        yield Spacer(1, 15)
         
         # Dividir el texto en párrafos por saltos de línea dobles
         paragraphs = analysis_text.split('\n\n')
@@ -1207,74 +1825,79 @@ class EnhancedReportGeneratorService:
             # Si el párrafo no está vacío
             if clean_paragraph:
                 # Remover posibles numeraciones automáticas (3.1, 3.2, etc.) si las hay
-                clean_paragraph = re.sub(r'^3\.\d+\s*', '', clean_paragraph)
+                clean_paragraph = SECTION_NUMBER_RE.sub('', clean_paragraph)
                 
                 # Remover saltos de línea internos del párrafo
                 clean_paragraph = clean_paragraph.replace('\n', ' ')
                 
                 # Agregar como párrafo normal
-                story.append(Paragraph(clean_paragraph, self.styles['CustomNormal']))
-                story.append(Spacer(1, 12))
+                yield Paragraph(clean_paragraph, self.styles['CustomNormal'])
+                yield Spacer(1, 12)
         
-        return story
     def _generate_references(self, articles_data):
         """Generar referencias bibliográficas en formato APA"""
-        story = []
-        
-        story.append(Paragraph("REFERENCES", self.styles['CustomHeading2']))
+        selected_articles = self._get_article_stats(articles_data).selected
+        if not selected_articles:  # Sin artículos seleccionados no se agrega una sección vacía
+            return
         
-        selected_articles = [a for a in articles_data if a.get('estado') == 'SELECTED']
+        yield Paragraph("REFERENCES", self.styles['CustomHeading2'])
         
-        for i, article in enumerate(selected_articles[:30], 1):  # Limitar referencias
-            # Formato APA simplificado
-            authors = article.get('autores', 'Unknown authors')
-            year = article.get('anio_publicacion', 'n.d.')
-            title = article.get('titulo', 'Untitled')
-            journal = article.get('journal', 'Unknown journal')
-            
-            reference = f"[{i}] {authors} ({year}). {title}. {journal}."
-            story.append(Paragraph(reference, self.styles['Normal']))
-            story.append(Spacer(1, 6))
+        # Formato APA simplificado; la numeración [n] la pone la lista
+        references = [
+            f"{article.get('autores', 'Unknown authors')} ({article.get('anio_publicacion', 'n.d.')}). "
+            f"{article.get('titulo', 'Untitled')}. {article.get('journal', 'Unknown journal')}."
+            for article in selected_articles[:30]  # Limitar referencias
+        ]
         
-        return story
+        # Un solo flowable para toda la lista en vez de un Paragraph y un Spacer por referencia
+        yield ListFlowable(
+            [ListItem(Paragraph(reference, self.styles['Normal']), spaceAfter=6) for reference in references],
+            bulletType='1',
+            bulletFormat='[%s]',
+            bulletFontName=self.styles['Normal'].fontName,
+            bulletFontSize=self.styles['Normal'].fontSize,
+            leftIndent=24
+        )
     
     def _generate_conclusions(self, sms_data, articles_data):
         """Generar conclusiones usando IA"""
-        story = []
         
-        story.append(Paragraph("CONCLUSIONS", self.styles['CustomHeading2']))
+        yield Paragraph("CONCLUSIONS", self.styles['CustomHeading2'])
         
         # Generar conclusiones con IA
-        conclusions_prompt = (
+        conclusions_text = self._generate_section_text('conclusions', self._build_conclusions_prompt, sms_data, articles_data)
+        yield Paragraph(conclusions_text, self.styles['CustomNormal'])
+    
+    def _build_conclusions_prompt(self, sms_data, articles_data):
+        """Prompt de las conclusiones"""
+        return (
             f"Escribe 3 conclusiones para una revisión sistemática sobre {sms_data['titulo_estudio']}. "
             f"Basado en el análisis de {len(articles_data)} estudios. Incluye implicaciones para futuras investigaciones."
             f" Evita el uso de gerundios. Escribe en español, con coherencia y profundidad."
             f"solo dame el texto sin titulo ni listas."
             f"Responde SOLO con el párrafo, sin texto adicional."
         )
-        
-        conclusions_text = self._generate_ai_text(conclusions_prompt)
-        story.append(Paragraph(conclusions_text, self.styles['CustomNormal']))
-        
-        return story
     
-    def _extract_keywords_from_title(self, title):
-        """Extraer keywords del título"""
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _extract_keywords_from_title(title):
+        """Extraer keywords del título (tupla memoizada por título)"""
         # Implementación simple - en producción usar NLP más avanzado
-        stop_words = {'a', 'an', 'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
-        words = [word.lower() for word in title.split() if word.lower() not in stop_words and len(word) > 3]
-        return ', '.join(words[:6])  # Máximo 6 keywords
+        # Un solo lower() sobre el título; las palabras de 3 letras o menos se descartan antes de buscar en las stopwords
+        keywords = (word for word in title.lower().split() if len(word) > 3 and word not in TITLE_STOP_WORDS)
+        return tuple(islice(keywords, MAX_TITLE_KEYWORDS))  # Máximo 6 keywords
     
     def _base64_to_reportlab_image(self, base64_string, max_width=6*inch, max_height=4*inch):
         """Convertir imagen base64 a formato ReportLab"""
         try:
-            # Decodificar base64
-            image_data = base64.b64decode(base64_string)
-            image_buffer = io.BytesIO(image_data)
+            # Decodificar y reducir la figura al tamaño en que se va a mostrar
+            max_size_px = (int(max_width / inch * IMAGE_DPI), int(max_height / inch * IMAGE_DPI))
+            image_buffer = io.BytesIO(_downscale_base64_image(base64_string, max_size_px))
+            self._image_buffers.append(image_buffer)
             
             # Crear imagen ReportLab
-            image = RLImage(image_buffer, width=max_width, height=max_height)
+            image = RLImage(image_buffer, width=max_width, height=max_height, kind='proportional')  # Sin deformar la figura
             return image
         except Exception as e:
-            print(f"Error converting base64 to image: {e}")
+            logger.warning("Error converting base64 to image: %s", e)
             return None
\ No newline at end of file
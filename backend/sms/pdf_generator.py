@@ -1,68 +1,92 @@
 # backend/sms/pdf_generator.py
 from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
-import markdown
 from io import BytesIO
 
+def _build_styles():
+    """Hoja de estilos con los estilos personalizados"""
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(
+        name='CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=12,
+        textColor=colors.HexColor('#2563eb')
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='CustomHeading2',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=10,
+        textColor=colors.HexColor('#1f2937')
+    ))
+    return styles
+
+# Se construye una sola vez al importar el módulo y la comparten todas las instancias
+STYLES = _build_styles()
+
+# Separación entre líneas del markdown: va en el spaceAfter del estilo en vez de un Spacer por línea
+LINE_SPACING = 6
+BLANK_LINE_SPACE = 2 * LINE_SPACING  # Una línea en blanco equivalía a dos Spacer(1, 6)
+LINE_STYLES = {
+    name: ParagraphStyle(
+        name=f'{name}Line', parent=STYLES[name], spaceAfter=STYLES[name].spaceAfter + LINE_SPACING
+    )
+    for name in ('CustomTitle', 'CustomHeading2', 'Heading3', 'Normal')
+}
+
 class PDFGenerator:
     def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self.setup_custom_styles()
+        self.styles = STYLES
     
-    def setup_custom_styles(self):
-        """Configurar estilos personalizados"""
-        self.styles.add(ParagraphStyle(
-            name='CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=16,
-            spaceAfter=12,
-            textColor=colors.HexColor('#2563eb')
-        ))
-        
-        self.styles.add(ParagraphStyle(
-            name='CustomHeading2',
-            parent=self.styles['Heading2'],
-            fontSize=14,
-            spaceAfter=10,
-            textColor=colors.HexColor('#1f2937')
-        ))
-    
-    def generate_pdf(self, markdown_content, title):
-        """Generar PDF desde contenido markdown"""
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=inch, bottomMargin=inch)
-        
-        # Convertir markdown a HTML
-        html_content = markdown.markdown(markdown_content, extensions=['tables'])
+    def generate_pdf(self, markdown_content, title, output_stream=None):
+        """
+        Generar PDF desde contenido markdown
         
+        Si se indica output_stream (un objeto con write(), p. ej. un HttpResponse), el PDF se escribe
+        ahí y se devuelve None; si no, se devuelven los bytes del PDF.
+        """
+        if output_stream is None:
+            buffer = BytesIO()
+            self.generate_pdf(markdown_content, title, output_stream=buffer)
+            return buffer.getvalue()  # getvalue no copia el buffer, a diferencia de seek(0) + read()
+        doc = BaseDocTemplate(output_stream, pagesize=A4, topMargin=inch, bottomMargin=inch)
+        # Mismo marco que SimpleDocTemplate, pero sumando el spaceAfter de una línea al spaceBefore de la
+        # siguiente (sin solaparlos), igual que cuando cada línea iba seguida de un Spacer
+        doc.addPageTemplates([PageTemplate(id='normal', frames=[Frame(
+            doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id='normal', overlapAttachedSpace=0
+        )])])
+
         # Parsear y convertir a elementos de ReportLab
-        story = []
-        story.append(Paragraph(title, self.styles['CustomTitle']))
-        story.append(Spacer(1, 12))
+        story = [Paragraph(title, self.styles['CustomTitle']), Spacer(1, 12)]
+        story.extend(self._markdown_flowables(markdown_content))
         
+        # Construir PDF
+        doc.build(story)
+    
+    def _markdown_flowables(self, markdown_content):
+        """Generar los elementos de ReportLab de cada línea del markdown"""
         # Procesar contenido (simplificado - en producción usarías un parser más robusto)
-        lines = markdown_content.split('\n')
-        
-        for line in lines:
+        blank_lines = 0
+        for line in markdown_content.split('\n'):
             line = line.strip()
             if not line:
-                story.append(Spacer(1, 6))
-            elif line.startswith('# '):
-                story.append(Paragraph(line[2:], self.styles['CustomTitle']))
-            elif line.startswith('## '):
-                story.append(Paragraph(line[3:], self.styles['CustomHeading2']))
-            elif line.startswith('**') and line.endswith('**'):
-                story.append(Paragraph(line[2:-2], self.styles['Heading3']))
+                blank_lines += 1  # Las líneas en blanco seguidas se juntan en un solo Spacer
+                continue
+            if blank_lines:
+                yield Spacer(1, blank_lines * BLANK_LINE_SPACE)
+                blank_lines = 0
+            # El primer carácter decide: las líneas de texto normal se clasifican con una sola comparación
+            first = line[:1]
+            if first == '#' and line.startswith('# '):
+                yield Paragraph(line[2:], LINE_STYLES['CustomTitle'])
+            elif first == '#' and line.startswith('## '):
+                yield Paragraph(line[3:], LINE_STYLES['CustomHeading2'])
+            elif first == '*' and line.startswith('**') and line.endswith('**'):
+                yield Paragraph(line[2:-2], LINE_STYLES['Heading3'])
             else:
-                story.append(Paragraph(line, self.styles['Normal']))
-            
-            story.append(Spacer(1, 6))
-        
-        # Construir PDF
-        doc.build(story)
-        
-        buffer.seek(0)
-        return buffer.read()
\ No newline at end of file
+                yield Paragraph(line, LINE_STYLES['Normal'])
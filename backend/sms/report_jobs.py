@@ -0,0 +1,79 @@
+# backend/sms/report_jobs.py
+"""
+Generación del reporte completo en segundo plano.
+
+Las llamadas a OpenAI y la construcción del PDF pueden tardar decenas de segundos; aquí se ejecutan
+en un pool de hilos del proceso y el estado (y el PDF terminado) se guarda en la cache de Django.
+Solo se usa con una cache compartida (SHARED_CACHE, es decir Redis): con la cache en memoria local
+la consulta de estado llegaría a otro proceso y no encontraría el trabajo.
+"""
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .enhanced_report_service import EnhancedReportGeneratorService
+
+logger = logging.getLogger(__name__)
+
+REPORT_JOB_TIMEOUT = 3600  # El estado y el PDF quedan disponibles una hora en la cache
+REPORT_JOB_DEADLINE = 1800  # Un trabajo sin terminar después de esto se da por perdido (p. ej. el proceso se reinició)
+REPORT_JOBS_AVAILABLE = getattr(settings, 'SHARED_CACHE', False)
+REPORT_JOB_PENDING = 'PENDING'
+REPORT_JOB_RUNNING = 'RUNNING'
+REPORT_JOB_SUCCESS = 'SUCCESS'
+REPORT_JOB_FAILURE = 'FAILURE'
+
+# Pocos hilos: cada reporte ya envía sus prompts en paralelo y el límite real es el de OpenAI
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'SMS_REPORT_JOB_WORKERS', 2), thread_name_prefix='sms-report'
+)
+
+
+def _job_key(job_id):
+    return f"sms:report_job:{job_id}"
+
+
+def _set_job(job_id, user_id, status, created_at, **extra):
+    cache.set(
+        _job_key(job_id),
+        {'status': status, 'user_id': user_id, 'created_at': created_at, **extra},
+        timeout=REPORT_JOB_TIMEOUT
+    )
+
+
+def submit_report_job(user_id, filename, sms_data, articles_data, visualizations_data=None):
+    """Encolar la generación del reporte y devolver el id del trabajo"""
+    job_id = uuid.uuid4().hex
+    created_at = time.time()
+    _set_job(job_id, user_id, REPORT_JOB_PENDING, created_at, filename=filename)
+    _executor.submit(_build_report, job_id, user_id, created_at, filename, sms_data, articles_data, visualizations_data)
+    return job_id
+
+
+def _build_report(job_id, user_id, created_at, filename, sms_data, articles_data, visualizations_data):
+    """Generar el PDF fuera del hilo de la solicitud (los datos ya vienen leídos de la base de datos)"""
+    _set_job(job_id, user_id, REPORT_JOB_RUNNING, created_at, filename=filename)
+    try:
+        pdf = EnhancedReportGeneratorService().generate_comprehensive_report(
+            sms_data, articles_data, visualizations_data
+        )
+    except Exception as e:
+        logger.exception("Error al generar el reporte %s", job_id)
+        _set_job(job_id, user_id, REPORT_JOB_FAILURE, created_at, filename=filename, error=str(e))
+        return
+    _set_job(job_id, user_id, REPORT_JOB_SUCCESS, created_at, filename=filename, pdf=pdf)
+
+
+def get_report_job(job_id, user_id):
+    """Estado del trabajo, o None si no existe, expiró o es de otro usuario"""
+    job = cache.get(_job_key(job_id))
+    if job is None or job['user_id'] != user_id:
+        return None
+    if job['status'] in (REPORT_JOB_PENDING, REPORT_JOB_RUNNING) and time.time() - job['created_at'] > REPORT_JOB_DEADLINE:
+        # El hilo que lo generaba ya no existe (reinicio del proceso) o quedó colgado
+        return dict(job, status=REPORT_JOB_FAILURE, error='El reporte no terminó dentro del tiempo límite')
+    return job
@@ -10,6 +10,7 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 
 from collections import Counter
+import functools
 import re
 import io
 import base64
@@ -45,6 +46,69 @@ except ImportError as e:
     KMeans = MockKMeans
     cosine_similarity = lambda x, y: [[0.5]]
 
+@functools.lru_cache(maxsize=None)
+def _load_embedding_model():
+    """
+    Carga el modelo de embeddings una sola vez por proceso.
+    
+    Devuelve (modelo, ml_disponible); antes cada analizador volvía a leer
+    el modelo desde disco al crearse.
+    """
+    if ML_DEPENDENCIES_AVAILABLE:
+        try:
+            print("🔄 Cargando modelo SentenceTransformers...")
+            model = SentenceTransformer('all-MiniLM-L6-v2')
+            print("✅ Modelo de embeddings cargado exitosamente")
+            return model, True
+        except Exception as e:
+            print(f"⚠️  Error cargando modelo SentenceTransformers: {e}")
+            print("🔄 Cambiando a modo básico...")
+            return MockSentenceTransformer(), False
+    print("🔄 Inicializando en modo básico...")
+    return MockSentenceTransformer(), False
+
+# Patrones metodológicos para identificación de enfoques
+# Estos patrones son como "huellas dactilares" que nos ayudan a identificar
+# diferentes tipos de metodologías de investigación
+METHODOLOGY_PATTERNS = {
+    'experimental': [
+        'experiment', 'experimental', 'trial', 'controlled study',
+        'randomized', 'intervention', 'treatment group', 'rct',
+        'clinical trial', 'controlled trial'
+    ],
+    'survey': [
+        'survey', 'questionnaire', 'poll', 'cross-sectional',
+        'descriptive study', 'questionnaire-based', 'survey study'
+    ],
+    'case_study': [
+        'case study', 'case analysis', 'case report',
+        'single case', 'multiple case', 'case-based', 'case series'
+    ],
+    'systematic_review': [
+        'systematic review', 'meta-analysis', 'literature review',
+        'scoping review', 'narrative review', 'review study'
+    ],
+    'qualitative': [
+        'qualitative', 'interview', 'focus group', 'ethnography',
+        'phenomenology', 'grounded theory', 'content analysis',
+        'thematic analysis', 'qualitative study'
+    ],
+    'quantitative': [
+        'quantitative', 'statistical analysis', 'correlation',
+        'regression', 'statistical model', 'numerical analysis',
+        'quantitative study', 'statistical study'
+    ],
+    'mixed_methods': [
+        'mixed methods', 'mixed-methods', 'triangulation',
+        'sequential explanatory', 'concurrent embedded', 'mixed approach'
+    ],
+    'simulation': [
+        'simulation', 'modeling', 'computational', 'model',
+        'algorithm', 'machine learning', 'artificial intelligence'
+    ]
+}
+
+
 class SemanticResearchAnalyzer:
 
     
@@ -59,67 +123,11 @@ class SemanticResearchAnalyzer:
         
         # CRÍTICO: Definimos TODOS los atributos que usaremos en la clase
         # Esto previene el error 'object has no attribute'
-        self.model = None
-        self.ml_available = False  # ←← ESTE era el atributo faltante
-        self.methodology_patterns = {}
-        
-        # Intentamos cargar el modelo de embeddings
-        if ML_DEPENDENCIES_AVAILABLE:
-            try:
-                print("🔄 Cargando modelo SentenceTransformers...")
-                self.model = SentenceTransformer('all-MiniLM-L6-v2')
-                self.ml_available = True
-                print("✅ Modelo de embeddings cargado exitosamente")
-            except Exception as e:
-                print(f"⚠️  Error cargando modelo SentenceTransformers: {e}")
-                print("🔄 Cambiando a modo básico...")
-                self.model = MockSentenceTransformer()
-                self.ml_available = False
-        else:
-            print("🔄 Inicializando en modo básico...")
-            self.model = MockSentenceTransformer()
-            self.ml_available = False
-        
-        # Definimos patrones metodológicos para identificación de enfoques
-        # Estos patrones son como "huellas dactilares" que nos ayudan a identificar
-        # diferentes tipos de metodologías de investigación
-        self.methodology_patterns = {
-            'experimental': [
-                'experiment', 'experimental', 'trial', 'controlled study',
-                'randomized', 'intervention', 'treatment group', 'rct',
-                'clinical trial', 'controlled trial'
-            ],
-            'survey': [
-                'survey', 'questionnaire', 'poll', 'cross-sectional',
-                'descriptive study', 'questionnaire-based', 'survey study'
-            ],
-            'case_study': [
-                'case study', 'case analysis', 'case report',
-                'single case', 'multiple case', 'case-based', 'case series'
-            ],
-            'systematic_review': [
-                'systematic review', 'meta-analysis', 'literature review',
-                'scoping review', 'narrative review', 'review study'
-            ],
-            'qualitative': [
-                'qualitative', 'interview', 'focus group', 'ethnography',
-                'phenomenology', 'grounded theory', 'content analysis',
-                'thematic analysis', 'qualitative study'
-            ],
-            'quantitative': [
-                'quantitative', 'statistical analysis', 'correlation',
-                'regression', 'statistical model', 'numerical analysis',
-                'quantitative study', 'statistical study'
-            ],
-            'mixed_methods': [
-                'mixed methods', 'mixed-methods', 'triangulation',
-                'sequential explanatory', 'concurrent embedded', 'mixed approach'
-            ],
-            'simulation': [
-                'simulation', 'modeling', 'computational', 'model',
-                'algorithm', 'machine learning', 'artificial intelligence'
-            ]
-        }
+        # El modelo de embeddings se carga una sola vez por proceso y se comparte
+        self.model, self.ml_available = _load_embedding_model()
+        
+        # Patrones metodológicos para identificación de enfoques (constante del módulo)
+        self.methodology_patterns = METHODOLOGY_PATTERNS
         
         print(f"🎯 Analizador inicializado - ML disponible: {self.ml_available}")
     
@@ -1162,13 +1170,11 @@ class SemanticResearchAnalyzer:
         
         # DATOS REALES de los artículos actuales
         total_articles = len(articles)
-        selected_articles = [a for a in articles if a.get('estado') == 'SELECTED']
-        rejected_articles = [a for a in articles if a.get('estado') == 'REJECTED']
-        pending_articles = [a for a in articles if a.get('estado') == 'PENDING']
-        
-        selected_count = len(selected_articles)
-        rejected_count = len(rejected_articles)
-        pending_count = len(pending_articles)
+        # Una sola pasada cuenta todos los estados
+        status_counts = Counter(a.get('estado') for a in articles)
+        selected_count = status_counts['SELECTED']
+        rejected_count = status_counts['REJECTED']
+        pending_count = status_counts['PENDING']
         
         print(f"   Artículos reales: Total={total_articles}, Seleccionados={selected_count}, Rechazados={rejected_count}, Pendientes={pending_count}")
         
@@ -1177,7 +1183,7 @@ class SemanticResearchAnalyzer:
         print(f"   Fuentes reales identificadas: {source_breakdown}")
         
         # ANÁLISIS REAL de fechas y proceso
-        process_analysis = self._analyze_real_process(articles, sms_info)
+        process_analysis = self._analyze_real_process(articles, sms_info, selected_count)
         print(f"   Análisis de proceso real: {process_analysis}")
         
         # CONSTRUCCIÓN de datos PRISMA reales
@@ -1216,10 +1222,8 @@ class SemanticResearchAnalyzer:
         """
         Analiza las fuentes REALES de donde vinieron los artículos.
         """
-        from collections import Counter
-        
-        # Analizamos campos que pueden indicar la fuente
-        sources = []
+        # Analizamos campos que pueden indicar la fuente (contando directamente, sin lista intermedia)
+        source_counts = Counter()
         for article in articles:
             # Buscamos en diferentes campos posibles
             source_fields = [
@@ -1233,7 +1237,7 @@ class SemanticResearchAnalyzer:
             source_found = False
             for field in source_fields:
                 if field and str(field).strip() and str(field).lower() not in ['none', 'null', 'nan', '']:
-                    sources.append(str(field).strip())
+                    source_counts[str(field).strip()] += 1
                     source_found = True
                     break
             
@@ -1241,16 +1245,13 @@ class SemanticResearchAnalyzer:
                 # Si no encontramos fuente, intentamos inferir del título o URL
                 titulo = article.get('titulo', '').lower()
                 if 'pubmed' in titulo or 'medline' in titulo:
-                    sources.append('PubMed')
+                    source_counts['PubMed'] += 1
                 elif 'scopus' in titulo:
-                    sources.append('Scopus')
+                    source_counts['Scopus'] += 1
                 elif 'web of science' in titulo or 'wos' in titulo:
-                    sources.append('Web of Science')
+                    source_counts['Web of Science'] += 1
                 else:
-                    sources.append('Manual/Other')
-        
-        # Contamos fuentes
-        source_counts = Counter(sources)
+                    source_counts['Manual/Other'] += 1
         
         # Identificamos fuentes principales vs adicionales
         main_databases = ['pubmed', 'scopus', 'web of science', 'medline']
@@ -1280,9 +1281,10 @@ class SemanticResearchAnalyzer:
             'main_databases_count': main_count
         }
 
-    def _analyze_real_process(self, articles, sms_info=None):
+    def _analyze_real_process(self, articles, sms_info=None, selected_count=None):
         """
         Analiza el proceso REAL de selección basado en fechas y estados.
+        selected_count evita volver a recorrer los artículos si ya se contaron.
         """
         from datetime import datetime
         
@@ -1307,7 +1309,8 @@ class SemanticResearchAnalyzer:
         estimated_duplicates = max(1, int(total_real * 0.08))  # 8% estimado
         
         # Estimamos exclusiones tempranas basándonos en la tasa de selección
-        selected_count = len([a for a in articles if a.get('estado') == 'SELECTED'])
+        if selected_count is None:
+            selected_count = sum(1 for a in articles if a.get('estado') == 'SELECTED')
         if selected_count > 0:
             selection_rate = selected_count / total_real
             # Si la tasa de selección es muy alta, estimamos pocas exclusiones tempranas
@@ -1966,4 +1969,15 @@ class SemanticResearchAnalyzer:
         return {
             'image': image_base64,
             'stats': stats
-        }
\ No newline at end of file
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def get_semantic_analyzer():
+    """
+    Analizador compartido por todo el proceso.
+    
+    El analizador no guarda estado entre llamadas, así que las vistas y el
+    servicio de reportes pueden reutilizar la misma instancia.
+    """
+    return SemanticResearchAnalyzer()
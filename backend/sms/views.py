@@ -11,6 +11,7 @@ from django.http import HttpResponse
 from django.db.models import Count
 from django.utils import timezone  # ← NUEVA IMPORTACIÓN para timezone
 import csv
+from collections import Counter
 import io
 import os
 import tempfile
@@ -32,8 +33,9 @@ from .search_utils import extract_keywords_and_synonyms, extract_keywords_and_sy
 from .science_parse import setup_science_parse, extract_pdf_metadata, analyze_with_chatgpt
 
 # NUEVA IMPORTACIÓN para el análisis semántico
-from .semantic_analysis import SemanticResearchAnalyzer  # ← NUEVA IMPORTACIÓN
+from .semantic_analysis import get_semantic_analyzer  # ← NUEVA IMPORTACIÓN
 from .enhanced_report_service import EnhancedReportGeneratorService
+from .report_jobs import submit_report_job, get_report_job, REPORT_JOBS_AVAILABLE, REPORT_JOB_PENDING, REPORT_JOB_SUCCESS, REPORT_JOB_FAILURE
 # Intenta configurar Science-Parse al iniciar
 try:
     setup_science_parse()
@@ -314,6 +316,7 @@ class SMSViewSet(viewsets.ModelViewSet):
             
             # Preparar datos del SMS
             sms_data = {
+                'id': sms.id,  # Acota la cache semántica de IA a este SMS
                 'titulo_estudio': sms.titulo_estudio,
                 'autores': sms.autores,
                 'pregunta_principal': sms.pregunta_principal,
@@ -348,21 +351,31 @@ class SMSViewSet(viewsets.ModelViewSet):
             # Obtener visualizaciones del sistema
             visualizations_data = self._get_all_visualizations(pk)
             
-            # Generar reporte completo
-            report_service = EnhancedReportGeneratorService()
-            pdf_content = report_service.generate_comprehensive_report(
-                sms_data, articles_data, visualizations_data
-            )
-            
             # Generar nombre de archivo seguro
             safe_title = re.sub(r'[^\w\s-]', '', sms.titulo_estudio).strip()
             safe_title = re.sub(r'[-\s]+', '-', safe_title)
             filename = f"comprehensive_report_{safe_title}_{pk}.pdf"
             
+            # Con ?async=1 el reporte se genera en segundo plano y se consulta con comprehensive-report-status;
+            # sin cache compartida (Redis) se genera de forma síncrona, la consulta podría llegar a otro proceso
+            async_requested = str(request.query_params.get('async', request.data.get('async', ''))).lower() in ('1', 'true')
+            if async_requested and REPORT_JOBS_AVAILABLE:
+                job_id = submit_report_job(request.user.id, filename, sms_data, articles_data, visualizations_data)
+                return Response({
+                    'success': True,
+                    'job_id': job_id,
+                    'status': REPORT_JOB_PENDING
+                }, status=status.HTTP_202_ACCEPTED)
+            
+            # Generar reporte completo escribiendo el PDF directamente en la respuesta
+            response = HttpResponse(content_type='application/pdf')
+            report_service = EnhancedReportGeneratorService()
+            report_service.generate_comprehensive_report(
+                sms_data, articles_data, visualizations_data, output_stream=response
+            )
+            
             # Devolver como respuesta HTTP para descarga directa
-            response = HttpResponse(pdf_content, content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            response['Content-Length'] = len(pdf_content)
             
             return response
             
@@ -374,6 +387,32 @@ class SMSViewSet(viewsets.ModelViewSet):
                 'success': False
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @action(detail=True, methods=['get'], url_path=r'comprehensive-report-status/(?P<job_id>[0-9a-f]{32})')
+    def comprehensive_report_status(self, request, pk=None, job_id=None):
+        """
+        Consultar un reporte generado en segundo plano; cuando está listo devuelve el PDF
+        GET /api/sms/{id}/comprehensive-report-status/{job_id}/
+        """
+        self.get_object()  # Solo el dueño del SMS puede consultar sus reportes
+        job = get_report_job(job_id, request.user.id)
+        if job is None:
+            return Response({
+                'error': 'El trabajo no existe o ya expiró',
+                'success': False
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        if job['status'] == REPORT_JOB_SUCCESS:
+            response = HttpResponse(job['pdf'], content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="{job["filename"]}"'
+            return response
+        if job['status'] == REPORT_JOB_FAILURE:
+            return Response({
+                'error': f'Error al generar reporte completo: {job["error"]}',
+                'success': False,
+                'status': job['status']
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({'success': True, 'job_id': job_id, 'status': job['status']})
+    
     @action(detail=True, methods=['get'], url_path='preview-comprehensive-report')
     def preview_comprehensive_report(self, request, pk=None):
         """
@@ -389,10 +428,9 @@ class SMSViewSet(viewsets.ModelViewSet):
             selected_articles = articles.filter(estado='SELECTED').count()
             
             # Análisis por año
-            year_distribution = {}
-            for article in articles:
-                year = article.anio_publicacion or 'Unknown'
-                year_distribution[year] = year_distribution.get(year, 0) + 1
+            year_distribution = dict(Counter(
+                year or 'Unknown' for year in articles.values_list('anio_publicacion', flat=True)
+            ))
             
             # Visualizaciones disponibles
             visualizations_status = self._check_visualizations_availability(pk)
@@ -439,8 +477,7 @@ class SMSViewSet(viewsets.ModelViewSet):
         
         try:
             # Análisis semántico
-            from .semantic_analysis import SemanticResearchAnalyzer
-            analyzer = SemanticResearchAnalyzer()
+            analyzer = get_semantic_analyzer()
             
             # Obtener artículos
             sms = self.get_object()
@@ -566,7 +603,7 @@ class SMSViewSet(viewsets.ModelViewSet):
                 })
             
             # Inicializamos el analizador semántico
-            analyzer = SemanticResearchAnalyzer()
+            analyzer = get_semantic_analyzer()
             
             # Generamos el análisis completo
             analysis_result = analyzer.generar_figura_distribucion_estudios(articles_data)
@@ -627,7 +664,7 @@ class SMSViewSet(viewsets.ModelViewSet):
             }
             
             # Generamos diagrama PRISMA
-            analyzer = SemanticResearchAnalyzer()
+            analyzer = get_semantic_analyzer()
             result = analyzer.generar_diagrama_prisma(articles_data, sms_info)
             
             if result['success']:
@@ -692,7 +729,7 @@ class SMSViewSet(viewsets.ModelViewSet):
             }
             
             # Generar gráfico de burbujas
-            analyzer = SemanticResearchAnalyzer()
+            analyzer = get_semantic_analyzer()
             result = analyzer.generar_grafico_burbujas_tecnicas(articles_data)
             
             if result['success']:
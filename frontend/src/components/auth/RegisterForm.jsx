@@ -71,7 +71,7 @@ export default function RegisterForm() { //componente de registro
                 email: formData.email,
                 password: formData.password
             });
-            navigate('/auth/login');
+            navigate('/sms'); //el registro deja la sesión iniciada
         } catch (error) {
             console.error('Error durante el registro:', error);
             if (error.response?.data) {
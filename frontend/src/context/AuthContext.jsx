@@ -64,6 +64,12 @@ export const AuthProvider = ({ children }) => {
 
   const register = async (userData) => {
     const response = await authService.register(userData);
+    // El registro ya inicia la sesión (cookies + token de acceso), no hace falta pasar por /login/
+    if (response.data.access) {
+      localStorage.setItem('access_token', response.data.access);
+      setUser({ username: response.data.username });
+      setIsAuthenticated(true);
+    }
     return response;
   };
 